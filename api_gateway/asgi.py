@@ -0,0 +1,234 @@
+# Motor asíncrono del gateway: mismo contrato /api/<servicio>/<ruta> que main.py,
+# pero cada petición en vuelo es una corrutina y no un hilo bloqueado.
+# Ejecutar con: uvicorn asgi:app --host 0.0.0.0 --port 5005
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+import httpx
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from config import URLS, CONNECT_TIMEOUT, DEADLINES, ASYNC_POOL_SIZE, ASYNC_POOL_TIMEOUT, COALESCE_WAIT
+from upstreams import filtrar_cabeceras, es_ruta_streaming
+from single_flight import SingleFlightAsync
+from resiliencia import CONTROLES, RechazoResiliencia, estadisticas_resiliencia
+from balanceador import BALANCEADORES, iniciar_chequeo_salud, estadisticas_balanceo
+from composicion import ErrorComposicion, validar_partes, resultado_parte, resultado_error
+from cache import cache, clave_cache, ttl_ruta, etiquetas_lectura, etiquetas_mutacion
+
+# Un cliente (y por tanto un pool de conexiones) por servicio, creado al arrancar
+CLIENTES = {}
+lecturas = SingleFlightAsync(COALESCE_WAIT)
+
+def crear_cliente(servicio):
+    limites = httpx.Limits(max_connections=ASYNC_POOL_SIZE, max_keepalive_connections=ASYNC_POOL_SIZE)
+    timeout = httpx.Timeout(DEADLINES[servicio], connect=CONNECT_TIMEOUT, pool=ASYNC_POOL_TIMEOUT)
+    return httpx.AsyncClient(limits=limites, timeout=timeout)
+
+@asynccontextmanager
+async def ciclo_de_vida(app):
+    for servicio in URLS:
+        CLIENTES[servicio] = crear_cliente(servicio)
+    iniciar_chequeo_salud()
+    yield
+    for cliente in CLIENTES.values():
+        await cliente.aclose()
+    CLIENTES.clear()
+
+async def llamar_upstream(servicio, ruta, metodo, params, headers, contenido):
+    """Llamada protegida por bulkhead, circuit breaker y deadline, enviada a la
+    réplica elegida por el balanceador (ver main.py). Devuelve (resp, liberar, fallar):
+    el resultado se cuenta en el breaker una sola vez, en liberar()."""
+    cliente = CLIENTES[servicio]
+    control = CONTROLES[servicio]
+    grupo = BALANCEADORES[servicio]
+    control.entrar()
+    replica = grupo.elegir()
+
+    exito = True
+
+    def fallar():
+        nonlocal exito
+        exito = False
+
+    def liberar(contar=True):
+        if contar:
+            control.registrar(exito)
+        grupo.liberar(replica)
+        control.salir()
+
+    try:
+        upstream_req = cliente.build_request(
+            metodo, f"{replica.url}/{ruta}",
+            params=params,
+            content=contenido or None,
+            headers=headers
+        )
+        resp = await cliente.send(upstream_req, stream=True)
+    except BaseException as e:
+        if isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)):
+            grupo.marcar_caida(replica)
+        fallar()
+        # Una cancelación (cliente que se fue) no es culpa del servicio
+        liberar(contar=isinstance(e, httpx.HTTPError))
+        raise
+    if resp.status_code >= 500:
+        fallar()
+    return resp, liberar, fallar
+
+def cuerpo_streaming(resp, liberar, fallar):
+    """Iterador del cuerpo + cierre idempotente que devuelve réplica y bulkhead.
+    Un corte o timeout a mitad del cuerpo cuenta como fallo del servicio."""
+    cerrado = False
+
+    async def cerrar():
+        nonlocal cerrado
+        if not cerrado:
+            cerrado = True
+            await resp.aclose()
+            liberar()
+
+    async def iterar():
+        try:
+            async for bloque in resp.aiter_raw():
+                yield bloque
+        except httpx.HTTPError:
+            fallar()
+            raise
+        finally:
+            await cerrar()
+
+    return iterar(), cerrar
+
+async def leer_upstream(servicio, ruta, params, ttl, generacion):
+    """GET completo (cuerpo en memoria) para poder compartirlo y guardarlo en caché"""
+    resp, liberar, fallar = await llamar_upstream(servicio, ruta, 'GET', params, {}, None)
+    iterador, cerrar = cuerpo_streaming(resp, liberar, fallar)
+    try:
+        cuerpo = b"".join([bloque async for bloque in iterador])
+    finally:
+        await cerrar()
+    headers = filtrar_cabeceras(resp.headers)
+    if ttl and resp.status_code == 200:
+        etiquetas = etiquetas_lectura(servicio, ruta, params, cuerpo)
+        cache.guardar(clave_cache(servicio, ruta, params), cuerpo, resp.status_code, headers, ttl, etiquetas, generacion)
+    return cuerpo, resp.status_code, headers
+
+async def leer(servicio, ruta, params):
+    """Camino de lectura GET: caché -> single-flight -> upstream (ver main.py)"""
+    ttl = ttl_ruta(servicio, ruta)
+    if ttl:
+        entrada = cache.obtener(clave_cache(servicio, ruta, params))
+        if entrada:
+            return entrada.cuerpo, entrada.status, entrada.headers + [("X-Cache", "HIT")]
+    generacion = cache.generacion
+
+    clave = (clave_cache(servicio, ruta, params), generacion)
+    (cuerpo, status, headers), agrupada = await lecturas.ejecutar(
+        clave, lambda: leer_upstream(servicio, ruta, params, ttl, generacion))
+    extra = [("X-Cache", "MISS")] if ttl else []
+    if agrupada:
+        extra.append(("X-Coalesced", "true"))
+    return cuerpo, status, headers + extra
+
+def error_upstream(servicio, e):
+    """Traduce el fallo de una llamada a (status, mensaje, cabeceras); relanza lo desconocido"""
+    if isinstance(e, RechazoResiliencia):
+        return 503, str(e), {"Retry-After": str(int(e.reintentar_en) + 1)}
+    if isinstance(e, httpx.TimeoutException):
+        return 504, f"El servicio {servicio} no respondió a tiempo", {}
+    if isinstance(e, httpx.TransportError):
+        return 503, f"El servicio {servicio} no está disponible", {}
+    raise e
+
+async def gateway(request):
+    servicio = request.path_params['servicio']
+    ruta = request.path_params['ruta']
+    if servicio not in URLS:
+        return JSONResponse({"error": "Servicio no encontrado"}, status_code=404)
+
+    params = request.query_params.multi_items()
+    try:
+        if request.method == 'GET' and not es_ruta_streaming(servicio, ruta):
+            cuerpo, status, headers = await leer(servicio, ruta, params)
+            return Response(cuerpo, status, dict(headers))
+
+        cuerpo_peticion = await request.body()
+        headers = {}
+        if "content-type" in request.headers:
+            headers["Content-Type"] = request.headers["content-type"]
+        resp, liberar, fallar = await llamar_upstream(servicio, ruta, request.method, params, headers, cuerpo_peticion)
+    except (RechazoResiliencia, httpx.TransportError) as e:
+        status, mensaje, headers = error_upstream(servicio, e)
+        return JSONResponse({"error": mensaje}, status_code=status, headers=headers)
+
+    # C. Mutación exitosa: invalida las entradas afectadas
+    if request.method != 'GET' and resp.status_code < 300:
+        cache.invalidar(etiquetas_mutacion(servicio, ruta, _json_o_none(cuerpo_peticion)))
+
+    iterador, cerrar = cuerpo_streaming(resp, liberar, fallar)
+    return StreamingResponse(
+        iterador,
+        status_code=resp.status_code,
+        headers=dict(filtrar_cabeceras(resp.headers)),
+        background=BackgroundTask(cerrar)
+    )
+
+# --- COMPOSICIÓN: varias lecturas en paralelo, una sola respuesta ---
+async def ejecutar_parte(servicio, ruta, params):
+    try:
+        return resultado_parte(*await leer(servicio, ruta, params))
+    except (RechazoResiliencia, httpx.TransportError) as e:
+        status, mensaje, _ = error_upstream(servicio, e)
+        return resultado_error(status, mensaje)
+
+async def componer(request):
+    try:
+        partes = validar_partes(_json_o_none(await request.body()))
+    except ErrorComposicion as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    inicio = time.perf_counter()
+    resultados = await asyncio.gather(*(ejecutar_parte(*parte) for parte in partes.values()))
+    return JSONResponse({
+        "partes": dict(zip(partes.keys(), resultados)),
+        "duracionMs": round((time.perf_counter() - inicio) * 1000, 1)
+    })
+
+async def estadisticas_cache(request):
+    if request.method == 'DELETE':
+        cache.limpiar()
+        return JSONResponse({"mensaje": "Caché vaciada"})
+    return JSONResponse(cache.estadisticas())
+
+async def estadisticas_single_flight(request):
+    return JSONResponse(lecturas.estadisticas())
+
+async def estado_resiliencia(request):
+    return JSONResponse(estadisticas_resiliencia())
+
+async def estado_balanceo(request):
+    return JSONResponse(estadisticas_balanceo())
+
+def _json_o_none(cuerpo):
+    try:
+        return json.loads(cuerpo) if cuerpo else None
+    except ValueError:
+        return None
+
+app = Starlette(
+    routes=[
+        Route('/api/componer', componer, methods=['POST']),
+        Route('/api/{servicio}/{ruta:path}', gateway, methods=['GET', 'POST', 'PUT', 'DELETE', 'PATCH']),
+        Route('/admin/cache', estadisticas_cache, methods=['GET', 'DELETE']),
+        Route('/admin/single-flight', estadisticas_single_flight, methods=['GET']),
+        Route('/admin/resiliencia', estado_resiliencia, methods=['GET']),
+        Route('/admin/balanceo', estado_balanceo, methods=['GET'])
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=ciclo_de_vida
+)
@@ -0,0 +1,140 @@
+import itertools
+import socket
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+import requests
+from config import (REPLICAS, RESOLVER_DNS, ESTRATEGIA_BALANCEO, RUTA_SALUD,
+                    INTERVALO_SALUD, TIMEOUT_SALUD, FALLOS_PARA_SACAR)
+
+class Replica:
+    def __init__(self, url: str):
+        self.url = url
+        self.en_vuelo = 0
+        self.sana = True
+        self.fallos_salud = 0
+        self.peticiones = 0
+
+    def estadisticas(self):
+        return {
+            "url": self.url,
+            "sana": self.sana,
+            "enVuelo": self.en_vuelo,
+            "peticiones": self.peticiones,
+            "fallosSalud": self.fallos_salud
+        }
+
+class GrupoReplicas:
+    """Réplicas de un servicio y la estrategia para repartir las peticiones"""
+
+    def __init__(self, servicio: str, urls: list, estrategia: str):
+        self.servicio = servicio
+        self.urls_configuradas = urls
+        self.estrategia = estrategia
+        self.replicas = [Replica(u) for u in urls]
+        self._turno = itertools.count()
+        self._lock = threading.Lock()
+
+    def elegir(self) -> Replica:
+        with self._lock:
+            candidatas = [r for r in self.replicas if r.sana]
+            # Si ninguna está sana se prueba con todas: el circuit breaker decide
+            if not candidatas:
+                candidatas = self.replicas
+            turno = next(self._turno)
+            if self.estrategia == "round-robin":
+                replica = candidatas[turno % len(candidatas)]
+            else:
+                # Menos peticiones pendientes; el turno desempata entre iguales
+                minimo = min(r.en_vuelo for r in candidatas)
+                empatadas = [r for r in candidatas if r.en_vuelo == minimo]
+                replica = empatadas[turno % len(empatadas)]
+            replica.en_vuelo += 1
+            replica.peticiones += 1
+            return replica
+
+    def liberar(self, replica: Replica):
+        with self._lock:
+            replica.en_vuelo -= 1
+
+    def marcar_caida(self, replica: Replica):
+        """Chequeo pasivo: un error de conexión la saca hasta el próximo chequeo OK"""
+        with self._lock:
+            replica.sana = False
+            replica.fallos_salud = max(replica.fallos_salud, FALLOS_PARA_SACAR)
+
+    def registrar_chequeo(self, replica: Replica, ok: bool):
+        with self._lock:
+            if ok:
+                replica.sana = True
+                replica.fallos_salud = 0
+            else:
+                replica.fallos_salud += 1
+                if replica.fallos_salud >= FALLOS_PARA_SACAR:
+                    replica.sana = False
+
+    def actualizar_destinos(self, urls: list):
+        """Conserva el estado de las réplicas que siguen y agrega/quita el resto"""
+        with self._lock:
+            actuales = {r.url: r for r in self.replicas}
+            nuevas = [actuales.get(u) or Replica(u) for u in urls]
+            if nuevas:
+                self.replicas = nuevas
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "estrategia": self.estrategia,
+                "replicas": [r.estadisticas() for r in self.replicas]
+            }
+
+BALANCEADORES = {s: GrupoReplicas(s, urls, ESTRATEGIA_BALANCEO) for s, urls in REPLICAS.items()}
+
+# --- DESCUBRIMIENTO Y CHEQUEO ACTIVO DE SALUD ---
+
+def resolver(url: str) -> list:
+    """Una URL por cada IP del host (docker-compose --scale publica todas en el DNS)"""
+    partes = urlsplit(url)
+    try:
+        infos = socket.getaddrinfo(partes.hostname, partes.port, socket.AF_INET, socket.SOCK_STREAM)
+    except socket.gaierror:
+        return [url]
+    ips = sorted({info[4][0] for info in infos})
+    puerto = f":{partes.port}" if partes.port else ""
+    return [urlunsplit((partes.scheme, f"{ip}{puerto}", partes.path, "", "")) for ip in ips]
+
+def chequear_grupo(grupo: GrupoReplicas, sesion):
+    if RESOLVER_DNS:
+        urls = []
+        for url in grupo.urls_configuradas:
+            urls.extend(u for u in resolver(url) if u not in urls)
+        grupo.actualizar_destinos(urls)
+    for replica in list(grupo.replicas):
+        try:
+            resp = sesion.get(f"{replica.url}{RUTA_SALUD}", timeout=TIMEOUT_SALUD)
+            ok = resp.status_code < 500
+        except requests.exceptions.RequestException:
+            ok = False
+        grupo.registrar_chequeo(replica, ok)
+
+def _bucle_salud():
+    sesion = requests.Session()
+    while True:
+        for grupo in BALANCEADORES.values():
+            try:
+                chequear_grupo(grupo, sesion)
+            except Exception as e:
+                print(f" [!] Error en chequeo de salud de {grupo.servicio}: {e}", flush=True)
+        time.sleep(INTERVALO_SALUD)
+
+_chequeo_iniciado = False
+
+def iniciar_chequeo_salud():
+    global _chequeo_iniciado
+    if _chequeo_iniciado:
+        return
+    _chequeo_iniciado = True
+    threading.Thread(target=_bucle_salud, name="chequeo-salud", daemon=True).start()
+
+def estadisticas_balanceo():
+    return {servicio: grupo.estadisticas() for servicio, grupo in BALANCEADORES.items()}
@@ -0,0 +1,60 @@
+# Benchmark: compara el gateway Flask (main.py) contra el motor asíncrono (asgi.py)
+# Uso: python benchmark_gateway.py --ruta /api/medicos/buscar?q=a -n 5000 -c 200
+import argparse
+import asyncio
+import time
+import httpx
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+async def medir(base_url, ruta, total, concurrencia):
+    """Lanza `total` GETs con `concurrencia` peticiones en vuelo y mide latencias"""
+    latencias = []
+    errores = 0
+    pendientes = iter(range(total))
+    limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limites, timeout=60) as cliente:
+        async def trabajador():
+            nonlocal errores
+            for _ in pendientes:
+                inicio = time.perf_counter()
+                try:
+                    resp = await cliente.get(ruta)
+                    if resp.status_code >= 500:
+                        errores += 1
+                except httpx.HTTPError:
+                    errores += 1
+                latencias.append(time.perf_counter() - inicio)
+
+        inicio_total = time.perf_counter()
+        await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+        duracion = time.perf_counter() - inicio_total
+
+    return {
+        "rps": total / duracion,
+        "p50_ms": percentil(latencias, 50) * 1000,
+        "p99_ms": percentil(latencias, 99) * 1000,
+        "errores": errores
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del API Gateway: Flask vs ASGI")
+    parser.add_argument("--flask", default="http://localhost:5000", help="URL base del gateway Flask")
+    parser.add_argument("--asgi", default="http://localhost:5005", help="URL base del gateway asíncrono")
+    parser.add_argument("--ruta", default="/api/medicos/buscar?q=a", help="Ruta a consultar en ambos modos")
+    parser.add_argument("-n", "--total", type=int, default=2000, help="Peticiones por modo")
+    parser.add_argument("-c", "--concurrencia", type=int, default=100, help="Peticiones simultáneas")
+    args = parser.parse_args()
+
+    print(f"Ruta: {args.ruta} | peticiones: {args.total} | concurrencia: {args.concurrencia}")
+    print(f"{'modo':<8}{'req/s':>10}{'p50 (ms)':>12}{'p99 (ms)':>12}{'errores':>10}")
+    for modo, base_url in (("flask", args.flask), ("asgi", args.asgi)):
+        r = asyncio.run(medir(base_url, args.ruta, args.total, args.concurrencia))
+        print(f"{modo:<8}{r['rps']:>10.1f}{r['p50_ms']:>12.1f}{r['p99_ms']:>12.1f}{r['errores']:>10}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+import json
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from config import CACHE_MAX_BYTES, TTL_RUTAS
+
+# Rutas GET cacheables ya compiladas: (servicio, regex, ttl)
+_RUTAS = [(servicio, re.compile(patron), ttl) for servicio, patron, ttl in TTL_RUTAS]
+
+class EntradaCache:
+    def __init__(self, cuerpo: bytes, status: int, headers: list, expira: float, etiquetas: set):
+        self.cuerpo = cuerpo
+        self.status = status
+        self.headers = headers
+        self.expira = expira
+        self.etiquetas = etiquetas
+        # Tamaño aproximado: cuerpo + cabeceras
+        self.tamano = len(cuerpo) + sum(len(k) + len(v) for k, v in headers)
+
+class CacheRespuestas:
+    """Caché TTL + LRU acotada en bytes, con invalidación por etiquetas"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()          # clave -> EntradaCache (orden = uso)
+        self._por_etiqueta = defaultdict(set)   # etiqueta -> claves
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expulsiones = 0
+        self.invalidaciones = 0
+        # Cambia en cada invalidación: una lectura iniciada antes no se guarda
+        self.generacion = 0
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None or entrada.expira <= time.monotonic():
+                if entrada is not None:
+                    self._quitar(clave)
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.hits += 1
+            return entrada
+
+    def guardar(self, clave, cuerpo, status, headers, ttl, etiquetas, generacion):
+        entrada = EntradaCache(cuerpo, status, headers, time.monotonic() + ttl, etiquetas)
+        if entrada.tamano > self.max_bytes:
+            return
+        with self._lock:
+            if generacion != self.generacion:
+                return
+            if clave in self._entradas:
+                self._quitar(clave)
+            self._entradas[clave] = entrada
+            self._bytes += entrada.tamano
+            for etiqueta in etiquetas:
+                self._por_etiqueta[etiqueta].add(clave)
+            # Expulsión LRU hasta volver al límite de memoria
+            while self._bytes > self.max_bytes:
+                clave_vieja = next(iter(self._entradas))
+                self._quitar(clave_vieja)
+                self.expulsiones += 1
+
+    def invalidar(self, etiquetas):
+        with self._lock:
+            self.generacion += 1
+            for etiqueta in etiquetas:
+                for clave in list(self._por_etiqueta.get(etiqueta, ())):
+                    self._quitar(clave)
+                    self.invalidaciones += 1
+
+    def limpiar(self):
+        with self._lock:
+            self.generacion += 1
+            self._entradas.clear()
+            self._por_etiqueta.clear()
+            self._bytes = 0
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                "entradas": len(self._entradas),
+                "bytes": self._bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRatio": round(self.hits / consultas, 4) if consultas else 0.0,
+                "expulsiones": self.expulsiones,
+                "invalidaciones": self.invalidaciones
+            }
+
+    def _quitar(self, clave):
+        entrada = self._entradas.pop(clave)
+        self._bytes -= entrada.tamano
+        for etiqueta in entrada.etiquetas:
+            claves = self._por_etiqueta.get(etiqueta)
+            if claves is not None:
+                claves.discard(clave)
+                if not claves:
+                    del self._por_etiqueta[etiqueta]
+
+cache = CacheRespuestas(CACHE_MAX_BYTES)
+
+# --- POLÍTICAS POR RUTA ---
+
+def clave_cache(servicio, ruta, params):
+    """Clave = servicio + ruta + query ordenada (params: lista de pares)"""
+    return (servicio, ruta, tuple(sorted(params)))
+
+def ttl_ruta(servicio, ruta):
+    for s, patron, ttl in _RUTAS:
+        if s == servicio and patron.match(ruta):
+            return ttl
+    return None
+
+def _segmento(ruta):
+    return ruta.split('/', 1)[0]
+
+def etiquetas_lectura(servicio, ruta, params, cuerpo):
+    """Etiquetas con las que se guarda una respuesta GET, usadas luego para invalidar"""
+    etiquetas = {servicio, f"{servicio}:{_segmento(ruta)}"}
+    params = dict(params)
+    if servicio == "medicos" and ruta == "disponibilidad":
+        etiquetas.add(f"medico:{params.get('medicoId')}")
+        # Cada slot de la respuesta: reservar uno invalida esta disponibilidad
+        try:
+            for slot in json.loads(cuerpo):
+                etiquetas.add(f"slot:{slot['id']}")
+        except (ValueError, TypeError, KeyError):
+            pass
+    elif servicio == "medicos" and params.get("ids"):
+        etiquetas.update(f"medico:{i}" for i in params["ids"].split(","))
+    elif servicio == "medicos" and ruta not in ("", "buscar"):
+        etiquetas.add(f"medico:{ruta}")
+    elif servicio == "pacientes" and _segmento(ruta) not in ("listar", "buscar", "validar"):
+        etiquetas.add(f"paciente:{_segmento(ruta)}")
+    return etiquetas
+
+# Mutaciones conocidas: (servicio, regex sobre la ruta, función(match, datos) -> etiquetas)
+_INVALIDACIONES = [
+    ("medicos", re.compile(r"^reservar-slot/([^/]+)$"), lambda m, d: {f"slot:{m.group(1)}"}),
+    ("medicos", re.compile(r"^(?:retener|confirmar|liberar)-slot/([^/]+)$"), lambda m, d: {f"slot:{m.group(1)}"}),
+    ("medicos", re.compile(r"^(?:reservar|retener|confirmar|liberar)-slots$"),
+        lambda m, d: {f"slot:{i}" for i in d.get('slotIds') or []}),
+    ("medicos", re.compile(r"^configurar-horario$"), lambda m, d: {f"medico:{d.get('medicoId')}"}),
+    ("medicos", re.compile(r"^configurar-horarios$"), lambda m, d: {
+        f"medico:{h.get('medicoId')}" for h in d.get('horarios') or [] if isinstance(h, dict)}),
+    ("medicos", re.compile(r"^crear$"), lambda m, d: {"medicos:", "medicos:buscar"}),
+    ("pacientes", re.compile(r"^([^/]+)/domicilio$"),
+        lambda m, d: {f"paciente:{m.group(1)}", "pacientes:listar", "pacientes:buscar"}),
+    # POST de solo lectura: no invalidan nada
+    ("pacientes", re.compile(r"^(?:batch|validar)$"), lambda m, d: set()),
+    ("pacientes", re.compile(r"^(?:registrar|importar)$"), lambda m, d: {"pacientes:listar", "pacientes:buscar", "pacientes:validar"}),
+    # Agendar reserva el slot en médicos de forma directa (sin pasar por el gateway)
+    ("agendamiento", re.compile(r"^agendar$"), lambda m, d: {"agendamiento", f"slot:{d.get('slotId')}"}),
+    ("agendamiento", re.compile(r"^agendar/lote$"), lambda m, d: {"agendamiento"} | {
+        f"slot:{c.get('slotId')}" for c in d.get('citas') or [] if isinstance(c, dict)}),
+]
+
+def etiquetas_mutacion(servicio, ruta, datos):
+    """Etiquetas a invalidar tras un POST/PUT/PATCH/DELETE exitoso.
+    Si la mutación no es conocida se invalida todo el servicio."""
+    datos = datos if isinstance(datos, dict) else {}
+    for s, patron, regla in _INVALIDACIONES:
+        if s == servicio:
+            m = patron.match(ruta)
+            if m:
+                return regla(m, datos)
+    return {servicio}
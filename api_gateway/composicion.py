@@ -0,0 +1,47 @@
+import json
+from config import URLS, MAX_PARTES
+from upstreams import es_ruta_streaming
+
+# Composición: varias lecturas GET declaradas en un solo POST /api/componer
+# {"partes": {"medico": {"servicio": "medicos", "ruta": "buscar", "params": {"q": "House"}}, ...}}
+# Cada parte se ejecuta en paralelo por el mismo camino que un GET normal
+# (caché, single-flight, resiliencia, balanceo). Las rutas de streaming
+# (RUTAS_STREAMING) no se aceptan: la composición lee cada parte completa en memoria.
+
+class ErrorComposicion(Exception):
+    pass
+
+def validar_partes(datos):
+    """Devuelve {nombre: (servicio, ruta, params)} o lanza ErrorComposicion"""
+    if not isinstance(datos, dict) or not isinstance(datos.get('partes'), dict) or not datos['partes']:
+        raise ErrorComposicion("Se espera un objeto 'partes' con al menos una sub-petición")
+    if len(datos['partes']) > MAX_PARTES:
+        raise ErrorComposicion(f"Máximo {MAX_PARTES} partes por composición")
+
+    partes = {}
+    for nombre, parte in datos['partes'].items():
+        if not isinstance(parte, dict) or parte.get('servicio') not in URLS:
+            raise ErrorComposicion(f"Parte '{nombre}': servicio no encontrado")
+        ruta = str(parte.get('ruta', '')).lstrip('/')
+        if es_ruta_streaming(parte['servicio'], ruta):
+            raise ErrorComposicion(f"Parte '{nombre}': la ruta '{ruta}' es de streaming; pídala directamente")
+        params = parte.get('params') or {}
+        if not isinstance(params, dict):
+            raise ErrorComposicion(f"Parte '{nombre}': 'params' debe ser un objeto")
+        partes[nombre] = (parte['servicio'], ruta, [(str(k), str(v)) for k, v in params.items()])
+    return partes
+
+def resultado_parte(cuerpo: bytes, status: int, headers: list):
+    tipo = next((v for k, v in headers if k.lower() == 'content-type'), '')
+    resultado = {"status": status}
+    if 'json' in tipo:
+        try:
+            resultado["data"] = json.loads(cuerpo)
+            return resultado
+        except ValueError:
+            pass
+    resultado["data"] = cuerpo.decode('utf-8', errors='replace')
+    return resultado
+
+def resultado_error(status: int, mensaje: str):
+    return {"status": status, "error": mensaje}
@@ -0,0 +1,95 @@
+import os
+
+# Configuración de URLs (Nombres de servicio en Docker)
+URLS = {
+    "medicos": "http://medicos:5002",
+    "pacientes": "http://pacientes:5003",
+    "agendamiento": "http://agendamiento:5001",
+    "notificaciones": "http://notificaciones:5004"
+}
+
+# --- RÉPLICAS Y BALANCEO (balanceador.py) ---
+# Réplicas por servicio: GATEWAY_REPLICAS_<SERVICIO>=http://medicos-1:5002,http://medicos-2:5002
+# Si no se definen, se usa la URL de URLS.
+REPLICAS = {
+    s: [u.strip() for u in os.environ.get(f"GATEWAY_REPLICAS_{s.upper()}", url).split(",") if u.strip()]
+    for s, url in URLS.items()
+}
+
+# Con 1, cada host se resuelve por DNS y cada IP cuenta como réplica
+# (así funcionan las réplicas creadas con docker-compose --scale)
+RESOLVER_DNS = os.environ.get("GATEWAY_RESOLVER_DNS", "1") == "1"
+
+# "menos-pendientes" (least outstanding requests) o "round-robin"
+ESTRATEGIA_BALANCEO = os.environ.get("GATEWAY_BALANCEO", "menos-pendientes")
+
+# Chequeo activo de salud
+RUTA_SALUD = os.environ.get("GATEWAY_RUTA_SALUD", "/health")
+INTERVALO_SALUD = float(os.environ.get("GATEWAY_INTERVALO_SALUD", "5"))
+TIMEOUT_SALUD = float(os.environ.get("GATEWAY_TIMEOUT_SALUD", "1"))
+FALLOS_PARA_SACAR = int(os.environ.get("GATEWAY_FALLOS_SALUD", "2"))
+
+# --- POOL DE CONEXIONES HACIA LOS MICROSERVICIOS ---
+# Conexiones keep-alive que se reutilizan por cada servicio
+POOL_SIZE = int(os.environ.get("GATEWAY_POOL_SIZE", "20"))
+# Réplicas (hosts distintos) con pool propio dentro de la sesión de cada servicio
+MAX_REPLICAS = int(os.environ.get("GATEWAY_MAX_REPLICAS", "16"))
+
+# Timeout de conexión en segundos (el de lectura es el deadline de cada servicio)
+CONNECT_TIMEOUT = float(os.environ.get("GATEWAY_CONNECT_TIMEOUT", "2"))
+
+# Tamaño de cada bloque al reenviar la respuesta al cliente
+CHUNK_SIZE = int(os.environ.get("GATEWAY_CHUNK_SIZE", "65536"))
+
+# --- MOTOR ASÍNCRONO (asgi.py) ---
+# Conexiones máximas por servicio; las peticiones extra esperan turno en el pool
+ASYNC_POOL_SIZE = int(os.environ.get("GATEWAY_ASYNC_POOL_SIZE", "200"))
+ASYNC_POOL_TIMEOUT = float(os.environ.get("GATEWAY_ASYNC_POOL_TIMEOUT", "10"))
+
+# --- CACHÉ DE RESPUESTAS (cache.py) ---
+# Memoria máxima de la caché; al superarla se expulsan las entradas menos usadas (LRU)
+CACHE_MAX_BYTES = int(os.environ.get("GATEWAY_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# TTL en segundos por ruta GET: (servicio, expresión regular sobre la ruta, ttl)
+# Las rutas que no aparecen aquí nunca se guardan en caché
+TTL_RUTAS = [
+    ("medicos", r"^$", 30),
+    ("medicos", r"^buscar$", 30),
+    ("medicos", r"^disponibilidad$", 10),
+    ("medicos", r"^[0-9a-fA-F-]{36}$", 60),
+    ("pacientes", r"^[0-9a-fA-F-]{36}$", 60),
+]
+
+# --- SINGLE-FLIGHT (single_flight.py) ---
+# Espera máxima de una petición agrupada antes de llamar por su cuenta
+COALESCE_WAIT = float(os.environ.get("GATEWAY_COALESCE_WAIT", "5"))
+
+# Rutas GET que siempre se reenvían en streaming: no se agrupan ni se leen completas
+RUTAS_STREAMING = [
+    ("pacientes", r"^listar$"),
+]
+
+# --- RESILIENCIA (resiliencia.py) ---
+def _por_servicio(prefijo, defectos):
+    """Valor por servicio, sobrescribible con la variable <PREFIJO>_<SERVICIO>"""
+    return {s: type(v)(os.environ.get(f"{prefijo}_{s.upper()}", v)) for s, v in defectos.items()}
+
+# Deadline (timeout de lectura) por servicio, en segundos
+DEADLINES = _por_servicio("GATEWAY_DEADLINE", {
+    "medicos": 5.0, "pacientes": 5.0, "agendamiento": 15.0, "notificaciones": 5.0
+})
+
+# Bulkhead: peticiones simultáneas máximas hacia cada servicio
+BULKHEADS = _por_servicio("GATEWAY_BULKHEAD", {
+    "medicos": 50, "pacientes": 50, "agendamiento": 30, "notificaciones": 10
+})
+
+# Circuit breaker: fallos consecutivos para abrir, segundos abierto y sondas en semiabierto
+BREAKER_UMBRAL_FALLOS = int(os.environ.get("GATEWAY_BREAKER_UMBRAL", "5"))
+BREAKER_TIEMPO_ABIERTO = float(os.environ.get("GATEWAY_BREAKER_TIEMPO_ABIERTO", "15"))
+BREAKER_SONDAS = int(os.environ.get("GATEWAY_BREAKER_SONDAS", "1"))
+
+# --- COMPOSICIÓN (composicion.py) ---
+# Sub-peticiones máximas por llamada a /api/componer y hilos para ejecutarlas
+MAX_PARTES = int(os.environ.get("GATEWAY_MAX_PARTES", "10"))
+HILOS_COMPOSICION = int(os.environ.get("GATEWAY_HILOS_COMPOSICION", "32"))
@@ -1,35 +1,187 @@
-from flask import Flask, request, jsonify
-from flask_cors import CORS  
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, request, jsonify
+from flask_cors import CORS
 import requests
+from config import URLS, CONNECT_TIMEOUT, DEADLINES, CHUNK_SIZE, COALESCE_WAIT, HILOS_COMPOSICION
+from upstreams import SESIONES, filtrar_cabeceras, iterar_cuerpo, es_ruta_streaming
+from cache import cache, clave_cache, ttl_ruta, etiquetas_lectura, etiquetas_mutacion
+from single_flight import SingleFlight
+from resiliencia import CONTROLES, RechazoResiliencia, estadisticas_resiliencia
+from balanceador import BALANCEADORES, iniciar_chequeo_salud, estadisticas_balanceo
+from composicion import ErrorComposicion, validar_partes, resultado_parte, resultado_error
 
 app = Flask(__name__)
 CORS(app) # <--- ESTO PERMITE QUE TU HTML SE CONECTE
 
-# Configuración de URLs (Nombres de servicio en Docker)
-URLS = {
-    "medicos": "http://medicos:5002",
-    "pacientes": "http://pacientes:5003",
-    "agendamiento": "http://agendamiento:5001",
-    "notificaciones": "http://notificaciones:5004"
-}
+METODOS = ['GET', 'POST', 'PUT', 'DELETE', 'PATCH']
+lecturas = SingleFlight(COALESCE_WAIT)
+ejecutor_partes = ThreadPoolExecutor(max_workers=HILOS_COMPOSICION, thread_name_prefix="composicion")
+iniciar_chequeo_salud()
 
-@app.route('/api/<servicio>/<path:ruta>', methods=['GET', 'POST', 'PUT', 'DELETE', 'PATCH'])
+def llamar_upstream(servicio, ruta, params, metodo='GET', datos=None, content_type=None):
+    """Llamada protegida por bulkhead, circuit breaker y deadline del servicio,
+    enviada a la réplica elegida por el balanceador.
+    Devuelve (resp, liberar, fallar): liberar() se invoca al terminar de leer el cuerpo
+    y cuenta la llamada en el breaker una sola vez; fallar() la marca como fallida
+    (cuerpo cortado o que no llega a tiempo) antes de liberar."""
+    headers = {}
+    if content_type:
+        headers["Content-Type"] = content_type
+
+    control = CONTROLES[servicio]
+    grupo = BALANCEADORES[servicio]
+    control.entrar()
+    replica = grupo.elegir()
+
+    exito = True
+
+    def fallar():
+        nonlocal exito
+        exito = False
+
+    def liberar():
+        control.registrar(exito)
+        grupo.liberar(replica)
+        control.salir()
+
+    try:
+        # stream=True: no se descarga el cuerpo completo antes de responder
+        resp = SESIONES[servicio].request(
+            method=metodo,
+            url=f"{replica.url}/{ruta}",
+            params=params,
+            data=datos or None,
+            headers=headers,
+            timeout=(CONNECT_TIMEOUT, DEADLINES[servicio]),
+            stream=True
+        )
+    except requests.exceptions.RequestException as e:
+        if isinstance(e, requests.exceptions.ConnectionError):
+            grupo.marcar_caida(replica)
+        fallar()
+        liberar()
+        raise
+    if resp.status_code >= 500:
+        fallar()
+    return resp, liberar, fallar
+
+def leer_upstream(servicio, ruta, params, ttl, generacion):
+    """GET completo (cuerpo en memoria) para poder compartirlo y guardarlo en caché"""
+    resp, liberar, fallar = llamar_upstream(servicio, ruta, params)
+    headers = filtrar_cabeceras(resp.headers)
+    cuerpo = b"".join(iterar_cuerpo(resp, CHUNK_SIZE, liberar, fallar))
+    if ttl and resp.status_code == 200:
+        etiquetas = etiquetas_lectura(servicio, ruta, params, cuerpo)
+        cache.guardar(clave_cache(servicio, ruta, params), cuerpo, resp.status_code, headers, ttl, etiquetas, generacion)
+    return cuerpo, resp.status_code, headers
+
+def leer(servicio, ruta, params):
+    """Camino de lectura GET: caché -> single-flight -> upstream.
+    Devuelve (cuerpo, status, headers) con X-Cache / X-Coalesced agregadas."""
+    # A. Lecturas cacheables: se responden desde la caché si hay entrada vigente
+    ttl = ttl_ruta(servicio, ruta)
+    if ttl:
+        entrada = cache.obtener(clave_cache(servicio, ruta, params))
+        if entrada:
+            return entrada.cuerpo, entrada.status, entrada.headers + [("X-Cache", "HIT")]
+    generacion = cache.generacion
+
+    # B. Lecturas idénticas en vuelo se agrupan en una sola llamada.
+    # La generación de la caché va en la clave: tras una invalidación no
+    # se reutiliza una llamada iniciada antes.
+    clave = (clave_cache(servicio, ruta, params), generacion)
+    (cuerpo, status, headers), agrupada = lecturas.ejecutar(
+        clave, lambda: leer_upstream(servicio, ruta, params, ttl, generacion))
+    extra = [("X-Cache", "MISS")] if ttl else []
+    if agrupada:
+        extra.append(("X-Coalesced", "true"))
+    return cuerpo, status, headers + extra
+
+def error_upstream(servicio, e):
+    """Traduce el fallo de una llamada a (status, mensaje, cabeceras); relanza lo desconocido"""
+    if isinstance(e, RechazoResiliencia):
+        return 503, str(e), {"Retry-After": str(int(e.reintentar_en) + 1)}
+    if isinstance(e, requests.exceptions.Timeout):
+        return 504, f"El servicio {servicio} no respondió a tiempo", {}
+    if isinstance(e, requests.exceptions.ConnectionError):
+        return 503, f"El servicio {servicio} no está disponible", {}
+    if isinstance(e, requests.exceptions.RequestException):
+        # Respuesta cortada o ilegible (ChunkedEncodingError, ContentDecodingError...)
+        return 502, f"Respuesta inválida del servicio {servicio}", {}
+    raise e
+
+@app.route('/api/<servicio>/', defaults={'ruta': ''}, methods=METODOS)
+@app.route('/api/<servicio>/<path:ruta>', methods=METODOS)
 def gateway(servicio, ruta):
     if servicio not in URLS:
         return jsonify({"error": "Servicio no encontrado"}), 404
 
-    url_destino = f"{URLS[servicio]}/{ruta}"
+    params = list(request.args.items(multi=True))
+    try:
+        if request.method == 'GET' and not es_ruta_streaming(servicio, ruta):
+            cuerpo, status, headers = leer(servicio, ruta, params)
+            return Response(cuerpo, status, headers)
 
+        resp, liberar, fallar = llamar_upstream(servicio, ruta, params, request.method,
+                                        request.get_data(), request.content_type)
+    except (RechazoResiliencia, requests.exceptions.RequestException) as e:
+        status, mensaje, headers = error_upstream(servicio, e)
+        return jsonify({"error": mensaje}), status, headers
+
+    # C. Mutación exitosa: invalida las entradas afectadas
+    if request.method != 'GET' and resp.status_code < 300:
+        cache.invalidar(etiquetas_mutacion(servicio, ruta, request.get_json(silent=True)))
+
+    # Un corte a mitad del streaming ya no puede cambiar el status enviado:
+    # se cuenta como fallo del servicio y la conexión con el cliente se aborta
+    cuerpo = iterar_cuerpo(resp, CHUNK_SIZE, liberar, fallar)
+    return Response(cuerpo, resp.status_code, filtrar_cabeceras(resp.headers))
+
+# --- COMPOSICIÓN: varias lecturas en paralelo, una sola respuesta ---
+def ejecutar_parte(servicio, ruta, params):
     try:
-        resp = requests.request(
-            method=request.method,
-            url=url_destino,
-            params=request.args, 
-            json=request.get_json() if request.is_json else None
-        )
-        return (resp.content, resp.status_code, resp.headers.items())
-    except requests.exceptions.ConnectionError:
-        return jsonify({"error": f"El servicio {servicio} no está disponible"}), 503
+        return resultado_parte(*leer(servicio, ruta, params))
+    except (RechazoResiliencia, requests.exceptions.RequestException) as e:
+        status, mensaje, _ = error_upstream(servicio, e)
+        return resultado_error(status, mensaje)
+
+@app.route('/api/componer', methods=['POST'])
+def componer():
+    try:
+        partes = validar_partes(request.get_json(silent=True))
+    except ErrorComposicion as e:
+        return jsonify({"error": str(e)}), 400
+
+    inicio = time.perf_counter()
+    futuros = {nombre: ejecutor_partes.submit(ejecutar_parte, *parte) for nombre, parte in partes.items()}
+    resultados = {nombre: futuro.result() for nombre, futuro in futuros.items()}
+    return jsonify({
+        "partes": resultados,
+        "duracionMs": round((time.perf_counter() - inicio) * 1000, 1)
+    }), 200
+
+# --- ADMINISTRACIÓN ---
+@app.route('/admin/cache', methods=['GET'])
+def estadisticas_cache():
+    return jsonify(cache.estadisticas()), 200
+
+@app.route('/admin/cache', methods=['DELETE'])
+def limpiar_cache():
+    cache.limpiar()
+    return jsonify({"mensaje": "Caché vaciada"}), 200
+
+@app.route('/admin/single-flight', methods=['GET'])
+def estadisticas_single_flight():
+    return jsonify(lecturas.estadisticas()), 200
+
+@app.route('/admin/resiliencia', methods=['GET'])
+def estado_resiliencia():
+    return jsonify(estadisticas_resiliencia()), 200
+
+@app.route('/admin/balanceo', methods=['GET'])
+def estado_balanceo():
+    return jsonify(estadisticas_balanceo()), 200
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,131 @@
+import threading
+import time
+from config import URLS, BULKHEADS, BREAKER_UMBRAL_FALLOS, BREAKER_TIEMPO_ABIERTO, BREAKER_SONDAS
+
+# --- EXCEPCIONES: el gateway las traduce a 503 inmediato ---
+class RechazoResiliencia(Exception):
+    def __init__(self, mensaje, reintentar_en):
+        super().__init__(mensaje)
+        self.reintentar_en = reintentar_en
+
+class CircuitoAbierto(RechazoResiliencia):
+    pass
+
+class ServicioSaturado(RechazoResiliencia):
+    pass
+
+# --- CIRCUIT BREAKER ---
+class CircuitBreaker:
+    CERRADO = "CERRADO"
+    ABIERTO = "ABIERTO"
+    SEMIABIERTO = "SEMIABIERTO"
+
+    def __init__(self, umbral_fallos: int, tiempo_abierto: float, max_sondas: int):
+        self.umbral_fallos = umbral_fallos
+        self.tiempo_abierto = tiempo_abierto
+        self.max_sondas = max_sondas
+        self.estado = self.CERRADO
+        self.fallos_consecutivos = 0
+        self.abierto_desde = 0.0
+        self.sondas_en_vuelo = 0
+        self.aperturas = 0
+        self.rechazos = 0
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        """True si la llamada puede salir. En semiabierto solo pasan `max_sondas`."""
+        with self._lock:
+            if self.estado == self.ABIERTO:
+                if time.monotonic() - self.abierto_desde < self.tiempo_abierto:
+                    self.rechazos += 1
+                    return False
+                self.estado = self.SEMIABIERTO
+                self.sondas_en_vuelo = 0
+            if self.estado == self.SEMIABIERTO:
+                if self.sondas_en_vuelo >= self.max_sondas:
+                    self.rechazos += 1
+                    return False
+                self.sondas_en_vuelo += 1
+            return True
+
+    def registrar(self, exito: bool):
+        with self._lock:
+            if self.estado == self.SEMIABIERTO:
+                self.sondas_en_vuelo = max(0, self.sondas_en_vuelo - 1)
+            if exito:
+                # Un éxito rezagado no cierra un circuito que ya se abrió
+                if self.estado != self.ABIERTO:
+                    self.fallos_consecutivos = 0
+                    self.estado = self.CERRADO
+                return
+            self.fallos_consecutivos += 1
+            # Una sonda fallida reabre el circuito de inmediato
+            if self.estado == self.SEMIABIERTO or self.fallos_consecutivos >= self.umbral_fallos:
+                if self.estado != self.ABIERTO:
+                    self.aperturas += 1
+                self.estado = self.ABIERTO
+                self.abierto_desde = time.monotonic()
+
+    def segundos_para_sonda(self):
+        return max(0.0, self.tiempo_abierto - (time.monotonic() - self.abierto_desde))
+
+# --- BULKHEAD ---
+class Bulkhead:
+    """Límite de llamadas simultáneas; si está lleno se rechaza sin esperar"""
+
+    def __init__(self, limite: int):
+        self.limite = limite
+        self.en_uso = 0
+        self.rechazos = 0
+        self._lock = threading.Lock()
+
+    def entrar(self):
+        with self._lock:
+            if self.en_uso >= self.limite:
+                self.rechazos += 1
+                return False
+            self.en_uso += 1
+            return True
+
+    def salir(self):
+        with self._lock:
+            self.en_uso -= 1
+
+# --- CONTROL POR SERVICIO ---
+class ControlServicio:
+    def __init__(self, servicio, limite):
+        self.servicio = servicio
+        self.bulkhead = Bulkhead(limite)
+        self.breaker = CircuitBreaker(BREAKER_UMBRAL_FALLOS, BREAKER_TIEMPO_ABIERTO, BREAKER_SONDAS)
+
+    def entrar(self):
+        """Reserva un cupo del bulkhead y pide permiso al breaker (o lanza el rechazo)"""
+        if not self.bulkhead.entrar():
+            raise ServicioSaturado(f"El servicio {self.servicio} está saturado", 1)
+        if not self.breaker.permitir():
+            self.bulkhead.salir()
+            raise CircuitoAbierto(f"El servicio {self.servicio} no está disponible (circuito abierto)",
+                                  self.breaker.segundos_para_sonda())
+
+    def registrar(self, exito: bool):
+        self.breaker.registrar(exito)
+
+    def salir(self):
+        self.bulkhead.salir()
+
+    def estadisticas(self):
+        b = self.breaker
+        return {
+            "circuito": b.estado,
+            "fallosConsecutivos": b.fallos_consecutivos,
+            "aperturas": b.aperturas,
+            "rechazosCircuito": b.rechazos,
+            "enUso": self.bulkhead.en_uso,
+            "limiteBulkhead": self.bulkhead.limite,
+            "rechazosBulkhead": self.bulkhead.rechazos
+        }
+
+CONTROLES = {servicio: ControlServicio(servicio, BULKHEADS[servicio]) for servicio in URLS}
+
+def estadisticas_resiliencia():
+    return {servicio: control.estadisticas() for servicio, control in CONTROLES.items()}
@@ -0,0 +1,110 @@
+import asyncio
+import threading
+
+# Single-flight: peticiones GET idénticas que llegan mientras otra igual está
+# en vuelo no salen al microservicio; esperan y reciben la misma respuesta.
+
+class _Metricas:
+    def __init__(self, espera_max: float):
+        self.espera_max = espera_max
+        self.lideres = 0      # llamadas que sí salieron al upstream
+        self.agrupadas = 0    # peticiones servidas con la respuesta de otra
+        self.vencidas = 0     # seguidores que superaron la espera y llamaron por su cuenta
+
+    def estadisticas(self):
+        total = self.lideres + self.agrupadas
+        return {
+            "lideres": self.lideres,
+            "agrupadas": self.agrupadas,
+            "vencidas": self.vencidas,
+            "ratioAgrupadas": round(self.agrupadas / total, 4) if total else 0.0,
+            "enVuelo": len(self._en_vuelo),
+            "esperaMaxSegundos": self.espera_max
+        }
+
+class _Llamada:
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error = None
+
+class SingleFlight(_Metricas):
+    """Versión para hilos (gateway Flask)"""
+
+    def __init__(self, espera_max: float):
+        super().__init__(espera_max)
+        self._en_vuelo = {}
+        self._lock = threading.Lock()
+
+    def ejecutar(self, clave, funcion):
+        """Devuelve (resultado, agrupada). `funcion` solo se ejecuta en el líder."""
+        with self._lock:
+            llamada = self._en_vuelo.get(clave)
+            lider = llamada is None
+            if lider:
+                llamada = _Llamada()
+                self._en_vuelo[clave] = llamada
+                self.lideres += 1
+
+        if lider:
+            try:
+                llamada.resultado = funcion()
+                return llamada.resultado, False
+            except Exception as e:
+                llamada.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._en_vuelo[clave]
+                llamada.evento.set()
+
+        # Seguidor: espera acotada; si vence, hace su propia llamada
+        if not llamada.evento.wait(self.espera_max):
+            with self._lock:
+                self.vencidas += 1
+            return funcion(), False
+        with self._lock:
+            self.agrupadas += 1
+        if llamada.error is not None:
+            raise llamada.error
+        return llamada.resultado, True
+
+class SingleFlightAsync(_Metricas):
+    """Versión para corrutinas (gateway ASGI)"""
+
+    def __init__(self, espera_max: float):
+        super().__init__(espera_max)
+        self._en_vuelo = {}
+
+    async def ejecutar(self, clave, funcion):
+        futuro = self._en_vuelo.get(clave)
+        if futuro is None:
+            futuro = asyncio.get_running_loop().create_future()
+            self._en_vuelo[clave] = futuro
+            self.lideres += 1
+            try:
+                resultado = await funcion()
+                futuro.set_result(resultado)
+                return resultado, False
+            except asyncio.CancelledError:
+                futuro.cancel()
+                raise
+            except Exception as e:
+                futuro.set_exception(e)
+                futuro.exception()  # marcada como leída aunque no haya seguidores
+                raise
+            finally:
+                del self._en_vuelo[clave]
+
+        try:
+            resultado = await asyncio.wait_for(asyncio.shield(futuro), self.espera_max)
+        except asyncio.TimeoutError:
+            self.vencidas += 1
+            return await funcion(), False
+        except asyncio.CancelledError:
+            # Se canceló el líder (no esta petición): se llama por cuenta propia
+            if not futuro.cancelled():
+                raise
+            return await funcion(), False
+        self.agrupadas += 1
+        return resultado, True
@@ -0,0 +1,70 @@
+import re
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import HTTPError as ErrorLecturaUrllib3, ReadTimeoutError
+from config import URLS, POOL_SIZE, MAX_REPLICAS, RUTAS_STREAMING
+
+# Cabeceras hop-by-hop (pertenecen a una sola conexión) y las que el
+# servidor del gateway ya agrega por su cuenta: no se reenvían
+CABECERAS_EXCLUIDAS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailers", "transfer-encoding", "upgrade", "server", "date"
+}
+
+def crear_sesion():
+    """Sesión con pool keep-alive: reutiliza las conexiones TCP entre peticiones"""
+    sesion = requests.Session()
+    # pool_connections: un pool por réplica (host) del servicio
+    adapter = HTTPAdapter(pool_connections=MAX_REPLICAS, pool_maxsize=POOL_SIZE, max_retries=0)
+    sesion.mount("http://", adapter)
+    sesion.mount("https://", adapter)
+    return sesion
+
+# Una sesión (y por tanto un pool) por cada servicio de URLS
+SESIONES = {servicio: crear_sesion() for servicio in URLS}
+
+_RUTAS_STREAMING = [(servicio, re.compile(patron)) for servicio, patron in RUTAS_STREAMING]
+
+def es_ruta_streaming(servicio, ruta):
+    return any(s == servicio and patron.match(ruta) for s, patron in _RUTAS_STREAMING)
+
+def filtrar_cabeceras(headers):
+    return [(k, v) for k, v in headers.items() if k.lower() not in CABECERAS_EXCLUIDAS]
+
+class CuerpoUpstream:
+    """Reenvía el cuerpo tal cual llega (sin decodificar) y libera la conexión al terminar.
+    Werkzeug llama a close() aunque el cliente se desconecte antes de leer nada.
+    Un corte o timeout a mitad del cuerpo llama a al_fallar() y sale como excepción
+    de requests (ReadTimeout / ChunkedEncodingError), igual que un fallo al conectar."""
+
+    def __init__(self, resp, chunk_size, al_terminar=None, al_fallar=None):
+        self.resp = resp
+        self.chunk_size = chunk_size
+        self.al_terminar = al_terminar
+        self.al_fallar = al_fallar
+        self._cerrado = False
+
+    def __iter__(self):
+        try:
+            for bloque in self.resp.raw.stream(self.chunk_size, decode_content=False):
+                yield bloque
+        except ErrorLecturaUrllib3 as e:
+            # ProtocolError (conexión reiniciada), ReadTimeoutError, DecodeError...
+            if self.al_fallar:
+                self.al_fallar()
+            if isinstance(e, ReadTimeoutError):
+                raise requests.exceptions.ReadTimeout(e)
+            raise requests.exceptions.ChunkedEncodingError(e)
+        finally:
+            self.close()
+
+    def close(self):
+        if self._cerrado:
+            return
+        self._cerrado = True
+        self.resp.close()
+        if self.al_terminar:
+            self.al_terminar()
+
+def iterar_cuerpo(resp, chunk_size, al_terminar=None, al_fallar=None):
+    return CuerpoUpstream(resp, chunk_size, al_terminar, al_fallar)
@@ -0,0 +1,194 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, wait
+import pika
+
+# --- CONFIGURACIÓN ---
+BROKER_HOST = os.getenv("BROKER_HOST", "broker")
+COLA_NOTIFICACIONES = "cola_notificaciones"
+REINTENTO_CONEXION = float(os.getenv("BROKER_REINTENTO", "2"))
+MAX_PENDIENTES = int(os.getenv("BROKER_MAX_PENDIENTES", "10000"))
+
+class ErrorPublicacion(Exception):
+    pass
+
+def _tomar(futuro: Future) -> bool:
+    """Marca el Future como en curso (desde aquí ya no se puede cancelar).
+    False si quien publicó lo canceló antes."""
+    return futuro.running() or futuro.set_running_or_notify_cancel()
+
+class PublicadorEventos:
+    """Publicador persistente con confirmaciones del broker (publisher confirms).
+
+    Una sola conexión asíncrona (SelectConnection) vive en un hilo propio; los
+    hilos de Flask solo encolan el mensaje y reciben un Future que se resuelve
+    cuando el broker confirma. El broker puede confirmar varios mensajes con un
+    solo ack (multiple=True), así que las esperas se agrupan solas.
+    El publicador no reintenta: si la conexión cae, todo lo pendiente falla con
+    ErrorPublicacion y quien publicó decide (la outbox lo vuelve a enviar).
+    Un Future cancelado antes de salir hacia el broker ya no se envía."""
+
+    def __init__(self, host: str, cola: str):
+        self.host = host
+        self.cola = cola
+        self._por_enviar = deque()   # (cuerpo, futuro) esperando canal
+        self._sin_confirmar = {}     # delivery_tag -> (cuerpo, futuro)
+        self._tag = 0
+        self._lock = threading.Lock()
+        self._conexion = None
+        self._canal = None
+        self._detenido = False
+        self.confirmados = 0
+        self.rechazados = 0
+        self.perdidos = 0   # fallados por desconexión o cancelados antes de enviarse
+        self.reconexiones = 0
+        self._hilo = threading.Thread(target=self._ejecutar, name="publicador-eventos", daemon=True)
+        self._hilo.start()
+
+    # --- API PÚBLICA (cualquier hilo) ---
+    def publicar(self, mensaje: dict) -> Future:
+        futuro = Future()
+        with self._lock:
+            if len(self._por_enviar) + len(self._sin_confirmar) >= MAX_PENDIENTES:
+                futuro.set_exception(ErrorPublicacion("Demasiados eventos pendientes de confirmar"))
+                return futuro
+            self._por_enviar.append((json.dumps(mensaje), futuro))
+            conexion = self._conexion
+        if conexion is not None:
+            try:
+                conexion.ioloop.add_callback_threadsafe(self._vaciar)
+            except Exception:
+                pass  # se enviará al reconectar
+        return futuro
+
+    def publicar_lote(self, mensajes: list, timeout: float = None) -> list:
+        """Publica todos y espera las confirmaciones una sola vez. Devuelve los Futures."""
+        futuros = [self.publicar(m) for m in mensajes]
+        wait(futuros, timeout=timeout)
+        return futuros
+
+    @property
+    def conectado(self):
+        return self._canal is not None
+
+    def cerrar(self):
+        self._detenido = True
+        conexion = self._conexion
+        if conexion is not None:
+            conexion.ioloop.add_callback_threadsafe(conexion.close)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "conectado": self.conectado,
+                "porEnviar": len(self._por_enviar),
+                "sinConfirmar": len(self._sin_confirmar),
+                "confirmados": self.confirmados,
+                "rechazados": self.rechazados,
+                "perdidos": self.perdidos,
+                "reconexiones": self.reconexiones
+            }
+
+    # --- HILO DEL BROKER ---
+    def _ejecutar(self):
+        while not self._detenido:
+            conexion = pika.SelectConnection(
+                pika.ConnectionParameters(self.host),
+                on_open_callback=self._conexion_abierta,
+                on_open_error_callback=self._conexion_fallida,
+                on_close_callback=self._conexion_cerrada)
+            with self._lock:
+                self._conexion = conexion
+            conexion.ioloop.start()
+            if not self._detenido:
+                time.sleep(REINTENTO_CONEXION)
+
+    def _conexion_abierta(self, conexion):
+        conexion.channel(on_open_callback=self._canal_abierto)
+
+    def _conexion_fallida(self, conexion, error):
+        print(f" [!] Error Broker: {error!r}. Reintentando en {REINTENTO_CONEXION}s", flush=True)
+        conexion.ioloop.stop()
+
+    def _conexion_cerrada(self, conexion, motivo):
+        with self._lock:
+            self._canal = None
+            self._conexion = None
+            # No se reencola: quien publicó (el relay) ya puede haber dejado de
+            # esperar y reenviará desde la outbox; reencolar mandaría dos copias
+            pendientes = [f for _, f in self._por_enviar] + [f for _, f in self._sin_confirmar.values()]
+            self._por_enviar.clear()
+            self._sin_confirmar.clear()
+            self.perdidos += len(pendientes)
+            self.reconexiones += 1
+        for futuro in pendientes:
+            if _tomar(futuro):
+                futuro.set_exception(ErrorPublicacion("Conexión con el broker perdida"))
+        if not self._detenido:
+            print(f" [!] Conexión con el broker cerrada: {motivo}", flush=True)
+        conexion.ioloop.stop()
+
+    def _canal_abierto(self, canal):
+        canal.add_on_close_callback(self._canal_cerrado)
+        # La cola se declara una sola vez por conexión, no por evento
+        canal.confirm_delivery(self._confirmacion, callback=lambda _: canal.queue_declare(
+            queue=self.cola, durable=True, callback=lambda _: self._canal_listo(canal)))
+
+    def _canal_listo(self, canal):
+        with self._lock:
+            self._canal = canal
+            self._tag = 0
+        self._vaciar()
+
+    def _canal_cerrado(self, canal, motivo):
+        conexion = self._conexion
+        if conexion is not None and conexion.is_open:
+            conexion.close()
+
+    def _vaciar(self):
+        with self._lock:
+            canal = self._canal
+            if canal is None or not canal.is_open:
+                return
+            while self._por_enviar:
+                cuerpo, futuro = self._por_enviar[0]
+                if not _tomar(futuro):
+                    # Quien publicó dejó de esperarlo (se reintentará por su cuenta)
+                    self._por_enviar.popleft()
+                    self.perdidos += 1
+                    continue
+                try:
+                    canal.basic_publish(
+                        exchange='',
+                        routing_key=self.cola,
+                        body=cuerpo,
+                        properties=pika.BasicProperties(delivery_mode=2, content_type="application/json"))
+                except pika.exceptions.AMQPError:
+                    return  # el canal se está cerrando; se reintenta al reconectar
+                self._por_enviar.popleft()
+                self._tag += 1
+                self._sin_confirmar[self._tag] = (cuerpo, futuro)
+
+    def _confirmacion(self, frame):
+        metodo = frame.method
+        confirmado = isinstance(metodo, pika.spec.Basic.Ack)
+        with self._lock:
+            if metodo.multiple:
+                tags = [t for t in self._sin_confirmar if t <= metodo.delivery_tag]
+            else:
+                tags = [metodo.delivery_tag]
+            resueltos = [self._sin_confirmar.pop(t) for t in tags if t in self._sin_confirmar]
+            if confirmado:
+                self.confirmados += len(resueltos)
+            else:
+                self.rechazados += len(resueltos)
+        for _, futuro in resueltos:
+            if confirmado:
+                futuro.set_result(True)
+            else:
+                futuro.set_exception(ErrorPublicacion("El broker rechazó el evento"))
+
+publicador = PublicadorEventos(BROKER_HOST, COLA_NOTIFICACIONES)
@@ -0,0 +1,77 @@
+import os
+import threading
+
+# --- CONFIGURACIÓN ---
+LOTE = int(os.getenv("OUTBOX_LOTE", "100"))
+INTERVALO = float(os.getenv("OUTBOX_INTERVALO", "1"))
+TIMEOUT_CONFIRMACION = float(os.getenv("OUTBOX_TIMEOUT_CONFIRMACION", "10"))
+ESPERA_MAXIMA = float(os.getenv("OUTBOX_ESPERA_MAXIMA", "60"))
+
+class RelayOutbox:
+    """Hilo que vacía la tabla outbox hacia el broker.
+
+    Toma un lote de eventos pendientes, los publica, espera las confirmaciones
+    una vez por lote y borra solo los confirmados; el resto se reintenta con
+    espera exponencial. La entrega es al menos una vez: si una confirmación se
+    pierde, el evento puede llegar repetido (lleva citaId para reconocerlo)."""
+
+    def __init__(self, repo, publicador):
+        self.repo = repo
+        self.publicador = publicador
+        self._aviso = threading.Event()
+        self._hilo = None
+        self.enviados = 0
+        self.fallidos = 0
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._ejecutar, name="relay-outbox", daemon=True)
+            self._hilo.start()
+
+    def avisar(self):
+        """Despierta al relay sin esperar al siguiente intervalo"""
+        self._aviso.set()
+
+    def _ejecutar(self):
+        while True:
+            try:
+                enviados = self.procesar_lote() if self.publicador.conectado else 0
+            except Exception as e:
+                print(f" [!] Error en relay outbox: {e}", flush=True)
+                enviados = 0
+            # Lote completo: probablemente hay más, se sigue sin dormir
+            if enviados < LOTE:
+                self._aviso.wait(INTERVALO)
+                self._aviso.clear()
+
+    def procesar_lote(self):
+        pendientes = self.repo.eventos_pendientes(LOTE)
+        if not pendientes:
+            return 0
+        futuros = self.publicador.publicar_lote([evento for _, evento, _ in pendientes], TIMEOUT_CONFIRMACION)
+
+        confirmados, reintentos = [], []
+        for (id_evento, evento, intentos), futuro in zip(pendientes, futuros):
+            try:
+                futuro.result(timeout=0)
+                confirmados.append(id_evento)
+            except Exception:  # rechazado, conexión perdida o sin confirmar a tiempo
+                # Si aún no salió hacia el broker ya no sale (cancel() no afecta a lo enviado):
+                # el reintento es desde la outbox
+                futuro.cancel()
+                reintentos.append((id_evento, min(ESPERA_MAXIMA, 2 ** intentos)))
+
+        if confirmados:
+            self.repo.eliminar_eventos(confirmados)
+            self.enviados += len(confirmados)
+        if reintentos:
+            self.repo.posponer_eventos(reintentos)
+            self.fallidos += len(reintentos)
+        return len(confirmados)
+
+    def estadisticas(self):
+        return {
+            "pendientes": self.repo.contar_eventos_pendientes(),
+            "enviados": self.enviados,
+            "fallidos": self.fallidos
+        }
@@ -0,0 +1,142 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- CONFIGURACIÓN ---
+PACIENTES_URL = os.environ.get("PACIENTES_URL", "http://pacientes:5003")
+MEDICOS_URL = os.environ.get("MEDICOS_URL", "http://medicos:5002")
+
+# Timeouts en segundos: (conexión, lectura)
+TIMEOUT = (
+    float(os.environ.get("CLIENTES_CONNECT_TIMEOUT", "1")),
+    float(os.environ.get("CLIENTES_READ_TIMEOUT", "3"))
+)
+POOL_SIZE = int(os.environ.get("CLIENTES_POOL_SIZE", "20"))
+
+_UUID = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+
+# --- SESIÓN COMPARTIDA (keep-alive) Y HILOS PARA CONSULTAS EN PARALELO ---
+def _crear_sesion():
+    sesion = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=0)
+    sesion.mount("http://", adapter)
+    return sesion
+
+sesion = _crear_sesion()
+ejecutor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="clientes")
+
+class ErrorServicioExterno(Exception):
+    def __init__(self, servicio, causa):
+        super().__init__(f"Error conectando con {servicio}: {causa}")
+        self.servicio = servicio
+
+# --- CONSULTAS ---
+def buscar_paciente(paciente_id):
+    """Paciente por id (UUID) o por identificación exacta, o None.
+    Búsqueda exacta: /buscar podía devolver primero a otro paciente parecido."""
+    paciente_id = str(paciente_id)
+    ruta = paciente_id if _UUID.match(paciente_id) else f"identificacion/{quote(paciente_id, safe='')}"
+    try:
+        resp = sesion.get(f"{PACIENTES_URL}/{ruta}", timeout=TIMEOUT)
+        if resp.status_code == 404:
+            return None
+        resp.raise_for_status()
+        return resp.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        raise ErrorServicioExterno("Pacientes", e)
+
+def buscar_pacientes(paciente_ids):
+    """Varios pacientes (ids o identificaciones) en una sola llamada (POST /batch):
+    {id: paciente o None}. Solo se piden los campos que usa la cita."""
+    ids = list(dict.fromkeys(paciente_ids))
+    if not ids:
+        return {}
+    try:
+        resp = sesion.post(f"{PACIENTES_URL}/batch", timeout=TIMEOUT, json={
+            "ids": [str(i) for i in ids], "campos": ["id", "nombre", "email", "telefono"]})
+        resp.raise_for_status()
+        encontrados = resp.json()["pacientes"]
+    except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+        raise ErrorServicioExterno("Pacientes", e)
+    return {i: encontrados.get(str(i)) for i in ids}
+
+def buscar_medico(medico_id):
+    """Médico por clave primaria (GET /<id>), o None"""
+    try:
+        resp = sesion.get(f"{MEDICOS_URL}/{medico_id}", timeout=TIMEOUT)
+        if resp.status_code == 404:
+            return None
+        resp.raise_for_status()
+        return resp.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        raise ErrorServicioExterno("Médicos", e)
+
+def buscar_medicos(medico_ids):
+    """Varios médicos en una sola llamada (GET /?ids=a,b,c): {id: medico}"""
+    if not medico_ids:
+        return {}
+    try:
+        resp = sesion.get(f"{MEDICOS_URL}/", params={"ids": ",".join(medico_ids)}, timeout=TIMEOUT)
+        resp.raise_for_status()
+        return {m['id']: m for m in resp.json()}
+    except (requests.exceptions.RequestException, ValueError) as e:
+        raise ErrorServicioExterno("Médicos", e)
+
+# --- RESERVA EN DOS FASES: retener -> (guardar cita) -> confirmar / liberar ---
+def retener_slot(slot_id):
+    """Token de la retención, o None si el slot no está disponible"""
+    try:
+        resp = sesion.post(f"{MEDICOS_URL}/retener-slot/{slot_id}", timeout=TIMEOUT)
+        if resp.status_code in (404, 409):
+            return None
+        resp.raise_for_status()
+        return resp.json()['token']
+    except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+        raise ErrorServicioExterno("Médicos", e)
+
+def confirmar_slot(slot_id, token):
+    """True si la retención seguía vigente y quedó como reserva definitiva"""
+    try:
+        resp = sesion.post(f"{MEDICOS_URL}/confirmar-slot/{slot_id}", json={"token": token}, timeout=TIMEOUT)
+    except requests.exceptions.RequestException as e:
+        raise ErrorServicioExterno("Médicos", e)
+    return resp.status_code == 200
+
+def liberar_slot(slot_id, token):
+    """Compensación: si falla, la retención vence sola y el barrido libera el slot"""
+    try:
+        sesion.post(f"{MEDICOS_URL}/liberar-slot/{slot_id}", json={"token": token}, timeout=TIMEOUT)
+    except requests.exceptions.RequestException as e:
+        print(f" [!] No se pudo liberar el slot {slot_id}: {e}", flush=True)
+
+# --- RESERVA EN DOS FASES POR LOTE: un token para todos los slots ---
+def retener_slots(slot_ids, medico_ids):
+    """(token, retenidos, ajenos): ajenos son los slots que no pertenecen al médico de su cita"""
+    try:
+        resp = sesion.post(f"{MEDICOS_URL}/retener-slots", json={"slotIds": slot_ids, "medicoIds": medico_ids},
+                           timeout=TIMEOUT)
+        resp.raise_for_status()
+        datos = resp.json()
+        return datos['token'], set(datos['retenidos']), set(datos['ajenos'])
+    except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+        raise ErrorServicioExterno("Médicos", e)
+
+def confirmar_slots(token, slot_ids):
+    """Conjunto de slots cuya retención seguía vigente y quedó como reserva definitiva"""
+    try:
+        resp = sesion.post(f"{MEDICOS_URL}/confirmar-slots", json={"token": token, "slotIds": slot_ids},
+                           timeout=TIMEOUT)
+        resp.raise_for_status()
+        return set(resp.json()['confirmados'])
+    except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+        raise ErrorServicioExterno("Médicos", e)
+
+def liberar_slots(token, slot_ids):
+    """Compensación del lote: si falla, las retenciones vencen solas"""
+    try:
+        sesion.post(f"{MEDICOS_URL}/liberar-slots", json={"token": token, "slotIds": slot_ids}, timeout=TIMEOUT)
+    except requests.exceptions.RequestException as e:
+        print(f" [!] No se pudieron liberar {len(slot_ids)} slots del lote: {e}", flush=True)
@@ -1,30 +1,21 @@
 from flask import Blueprint, request, jsonify
-import requests
-import pika
-import json
 from domain.models import Cita, PacienteRef, MedicoRef
 from repositories.cita_repository import SQLiteCitaRepository
+from clients.servicios_externos import (ejecutor, buscar_paciente, buscar_pacientes, buscar_medico,
+                                        buscar_medicos, retener_slot, confirmar_slot, liberar_slot,
+                                        retener_slots, confirmar_slots, liberar_slots, ErrorServicioExterno)
+from clients.publicador_eventos import publicador
+from clients.relay_outbox import RelayOutbox
+from controllers.tiempos import Cronometro, metricas
 
 controller = Blueprint('cita_controller', __name__)
 repo = SQLiteCitaRepository()
+relay = RelayOutbox(repo, publicador)  # se inicia en main.py
 
 # --- 1. LÓGICA DE CONEXIÓN AL BROKER ---
-def publicar_evento(mensaje):
-    try:
-        connection = pika.BlockingConnection(pika.ConnectionParameters('broker'))
-        channel = connection.channel()
-        channel.queue_declare(queue='cola_notificaciones', durable=True)
-        
-        channel.basic_publish(
-            exchange='',
-            routing_key='cola_notificaciones',
-            body=json.dumps(mensaje),
-            properties=pika.BasicProperties(delivery_mode=2) # Persistente
-        )
-        connection.close()
-        print(f" [x] Evento enviado al Broker: {mensaje.get('asunto')}", flush=True)
-    except Exception as e:
-        print(f" [!] Error Broker: {e}", flush=True)
+# Los eventos no se publican durante la petición: se guardan en la tabla
+# outbox junto con la cita (misma transacción) y el relay los envía al broker
+# (clients/relay_outbox.py). Si el broker está caído, esperan en la outbox.
 
 # --- 2. HELPER: CONVERTIR OBJETO A DICCIONARIO JSON ---
 def cita_to_dict(c: Cita):
@@ -46,81 +37,271 @@ def cita_to_dict(c: Cita):
         }
     }
 
+def evento_cita_confirmada(cita: Cita):
+    return {
+        "citaId": str(cita.id),
+        "pacienteId": str(cita.paciente.id), # ¡Importante para el consumidor!
+        "destinatario": cita.paciente.email,
+        "asunto": "Cita Confirmada",
+        "mensaje": f"Hola {cita.paciente.nombre}, su cita con el Dr. {cita.medico.nombre} ha sido agendada para el {cita.fechaHora}.",
+        "tipo": "EMAIL"
+    }
+
+def evento_cita_anulada(cita: Cita, motivo: str):
+    return {
+        "citaId": str(cita.id),
+        "pacienteId": str(cita.paciente.id), # ¡Importante!
+        "destinatario": cita.paciente.email,
+        "asunto": "Cita Anulada",
+        "mensaje": f"Su cita del {cita.fechaHora} ha sido ANULADA. Motivo: {motivo}",
+        "tipo": "EMAIL"
+    }
+
+CAMPOS_CITA = ('pacienteId', 'medicoId', 'slotId', 'fechaHora', 'motivo')
+
+def campos_faltantes(data):
+    """Campos de CAMPOS_CITA ausentes o que no son texto no vacío"""
+    return [c for c in CAMPOS_CITA if not isinstance(data.get(c), str) or not data[c]]
+
+def crear_cita(data, info_pac, info_med):
+    """Cita en estado PENDIENTE: pasa a CONFIRMADA (agendar) recién con el slot confirmado"""
+    paciente_ref = PacienteRef(info_pac['id'], info_pac['nombre'], info_pac['email'], info_pac['telefono'])
+    medico_ref = MedicoRef(info_med['id'], f"{info_med['nombre']} {info_med['apellido']}", info_med['especialidad'])
+    return Cita(data['fechaHora'], data['motivo'], paciente_ref, medico_ref)
+
 # --- 3. ENDPOINT: AGENDAR CITA ---
 @controller.route('/agendar', methods=['POST'])
 def agendar_cita():
-    data = request.json
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Se espera un objeto JSON"}), 400
+    faltan = campos_faltantes(data)
+    if faltan:
+        return jsonify({"error": f"Campos requeridos: {', '.join(faltan)}"}), 400
+
+    tiempos = Cronometro()
+    propia = False      # la retención la tomó esta petición
+    confirmada = False
+    nueva_cita = None   # guardada como PENDIENTE, sin eventos
     try:
-        # A. OBTENER DATOS REALES DEL PACIENTE
-        try:
-            resp_pac = requests.get(f"http://pacientes:5003/buscar?q={data['pacienteId']}")
-            pacientes_encontrados = resp_pac.json()
-            if not pacientes_encontrados:
-                return jsonify({"error": "Paciente no encontrado"}), 404
-            
-            info_pac = pacientes_encontrados[0]
-            paciente_ref = PacienteRef(info_pac['id'], info_pac['nombre'], info_pac['email'], info_pac['telefono'])
-        except Exception as e:
-            return jsonify({"error": f"Error conectando con Pacientes: {e}"}), 500
-
-        # B. OBTENER DATOS REALES DEL MÉDICO
-        try:
-            resp_med = requests.get("http://medicos:5002/")
-            lista_medicos = resp_med.json()
-            info_med = next((m for m in lista_medicos if m['id'] == data['medicoId']), None)
-            
-            if not info_med:
-                return jsonify({"error": "Médico no encontrado"}), 404
-            
-            medico_ref = MedicoRef(info_med['id'], f"{info_med['nombre']} {info_med['apellido']}", info_med['especialidad'])
-        except Exception as e:
-            return jsonify({"error": f"Error conectando con Médicos: {e}"}), 500
-
-        # C. RESERVAR SLOT
-        resp_reserva = requests.patch(f"http://medicos:5002/reservar-slot/{data['slotId']}")
-        if resp_reserva.status_code != 200:
-             return jsonify({"error": "Turno no disponible"}), 409
-
-        # D. GUARDAR CITA (Dominio)
-        nueva_cita = Cita(data['fechaHora'], data['motivo'], paciente_ref, medico_ref)
+        slot_id = data['slotId']
+        # El cliente puede traer la retención que tomó al elegir el slot
+        token = data.get('retencionToken')
+        # A, B y C. PACIENTE, MÉDICO Y RETENCIÓN DEL SLOT (en paralelo):
+        # un slot ocupado se detecta sin esperar a las consultas
+        with tiempos.fase("consultas"):
+            fut_pac = ejecutor.submit(tiempos.medir, "paciente", buscar_paciente, data['pacienteId'])
+            fut_med = ejecutor.submit(tiempos.medir, "medico", buscar_medico, data['medicoId'])
+            fut_ret = None if token else ejecutor.submit(tiempos.medir, "retencion", retener_slot, slot_id)
+            try:
+                if fut_ret:
+                    token = fut_ret.result()
+                    propia = token is not None
+                info_pac = fut_pac.result()
+                info_med = fut_med.result()
+            except ErrorServicioExterno as e:
+                return jsonify({"error": str(e)}), 500
+
+        if not info_pac:
+            return jsonify({"error": "Paciente no encontrado"}), 404
+        if not info_med:
+            return jsonify({"error": "Médico no encontrado"}), 404
+        if not token:
+            return jsonify({"error": "Turno no disponible"}), 409
+
+        # D. GUARDAR CITA PENDIENTE (Dominio), todavía sin notificar a nadie
+        cita = crear_cita(data, info_pac, info_med)
+        with tiempos.fase("guardado"):
+            repo.save(cita)
+        nueva_cita = cita
+
+        # E. CONFIRMAR LA RETENCIÓN: recién aquí el slot queda reservado
+        with tiempos.fase("confirmacion"):
+            try:
+                confirmada = confirmar_slot(slot_id, token)
+            except ErrorServicioExterno:
+                confirmada = False
+        if not confirmada:
+            # La retención venció o médicos no respondió (la cita se descarta abajo)
+            return jsonify({"error": "Turno no disponible"}), 409
+
+        # F. ESTADO CONFIRMADA + EVENTO DE NOTIFICACIÓN (outbox), en una transacción
         nueva_cita.agendar() # Cambia estado a CONFIRMADA
-        repo.save(nueva_cita)
-
-        # E. NOTIFICAR (RabbitMQ)
-        evento = {
-            "citaId": str(nueva_cita.id),
-            "pacienteId": str(paciente_ref.id), # ¡Importante para el consumidor!
-            "destinatario": paciente_ref.email,
-            "asunto": "Cita Confirmada",
-            "mensaje": f"Hola {paciente_ref.nombre}, su cita con el Dr. {medico_ref.nombre} ha sido agendada para el {data['fechaHora']}.",
-            "tipo": "EMAIL"
-        }
-        publicar_evento(evento)
+        with tiempos.fase("estado"):
+            repo.update(nueva_cita, [evento_cita_confirmada(nueva_cita)])
+        relay.avisar()
 
-        return jsonify({"id": str(nueva_cita.id), "mensaje": "Cita agendada exitosamente"}), 201
+        metricas.registrar("agendar", tiempos.cerrar())
+        return jsonify({"id": str(nueva_cita.id), "mensaje": "Cita agendada exitosamente"}), 201, \
+            {"Server-Timing": tiempos.server_timing()}
 
+    except ErrorServicioExterno as e:
+        return jsonify({"error": str(e)}), 500
     except Exception as e:
         print(f"Error Agendar: {e}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        # Cualquier salida sin confirmar descarta la cita pendiente (no se envió
+        # ningún correo) y devuelve el slot al calendario
+        if nueva_cita is not None and not confirmada:
+            try:
+                repo.eliminar([nueva_cita.id])
+            except Exception as e:
+                print(f"Error descartando cita pendiente {nueva_cita.id}: {e}")
+        if propia and not confirmada:
+            liberar_slot(slot_id, token)
+
+# --- 3.1 ENDPOINT: AGENDAR VARIAS CITAS (importación desde otros sistemas) ---
+MAX_CITAS_POR_LOTE = 500
+
+@controller.route('/agendar/lote', methods=['POST'])
+def agendar_lote():
+    """Cada cita del lote tiene su propio resultado; una que falla no frena a las demás.
+    Mismo esquema que /agendar: retener -> guardar PENDIENTE -> confirmar -> CONFIRMADA + eventos."""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Se espera un objeto JSON con 'citas'"}), 400
+    items = data.get('citas')
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Se espera 'citas' con al menos una cita"}), 400
+    if len(items) > MAX_CITAS_POR_LOTE:
+        return jsonify({"error": f"Máximo {MAX_CITAS_POR_LOTE} citas por lote"}), 400
+
+    tiempos = Cronometro()
+    resultados = [None] * len(items)
+    validos = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict) or campos_faltantes(item):
+            resultados[i] = {"indice": i, "status": 400, "error": f"Campos requeridos: {', '.join(CAMPOS_CITA)}"}
+        else:
+            validos.append(i)
+
+    token, retenidos, confirmados = None, set(), set()
+    agendadas = []
+    try:
+        # A y B. Pacientes y médicos sin repetir, ambos grupos en paralelo
+        with tiempos.fase("consultas"):
+            fut_med = ejecutor.submit(tiempos.medir, "medicos", buscar_medicos,
+                                      list(dict.fromkeys(items[i]['medicoId'] for i in validos)))
+            pacientes = tiempos.medir("pacientes", buscar_pacientes, [items[i]['pacienteId'] for i in validos])
+            medicos = fut_med.result()
+
+        candidatos = []
+        for i in validos:
+            if not pacientes.get(items[i]['pacienteId']):
+                resultados[i] = {"indice": i, "status": 404, "error": "Paciente no encontrado"}
+            elif not medicos.get(items[i]['medicoId']):
+                resultados[i] = {"indice": i, "status": 404, "error": "Médico no encontrado"}
+            else:
+                candidatos.append(i)
+
+        # C. RETENER TODOS LOS SLOTS EN UNA LLAMADA (cada uno contra el médico de su cita)
+        ajenos = set()
+        if candidatos:
+            with tiempos.fase("retencion"):
+                token, retenidos, ajenos = retener_slots([items[i]['slotId'] for i in candidatos],
+                                                         [items[i]['medicoId'] for i in candidatos])
+
+        # D. Citas PENDIENTES, sin eventos, en una sola transacción
+        nuevas = []
+        libres = set(retenidos)
+        for i in candidatos:
+            item = items[i]
+            if item['slotId'] in ajenos:
+                resultados[i] = {"indice": i, "status": 400, "error": "El turno no pertenece al médico indicado"}
+            elif item['slotId'] not in libres:
+                resultados[i] = {"indice": i, "status": 409, "error": "Turno no disponible"}
+            else:
+                # Un slot repetido dentro del lote solo vale para la primera cita
+                libres.discard(item['slotId'])
+                nuevas.append((i, crear_cita(item, pacientes[item['pacienteId']], medicos[item['medicoId']])))
+        if nuevas:
+            with tiempos.fase("guardado"):
+                repo.save_lote([c for _, c in nuevas])
+
+            # E. CONFIRMAR LAS RETENCIONES: lo que venció mientras tanto no se agenda
+            with tiempos.fase("confirmacion"):
+                try:
+                    confirmados = confirmar_slots(token, [items[i]['slotId'] for i, _ in nuevas])
+                except ErrorServicioExterno:
+                    confirmados = set()
+            perdidas = []
+            for i, cita in nuevas:
+                if items[i]['slotId'] in confirmados:
+                    cita.agendar()
+                    agendadas.append(cita)
+                    resultados[i] = {"indice": i, "status": 201, "id": str(cita.id)}
+                else:
+                    perdidas.append(cita.id)
+                    resultados[i] = {"indice": i, "status": 409, "error": "Turno no disponible"}
+            if perdidas:
+                repo.eliminar(perdidas)
+
+            # F. Estado CONFIRMADA y eventos de notificación juntos (outbox)
+            if agendadas:
+                repo.update_lote(agendadas, [evento_cita_confirmada(c) for c in agendadas])
+                relay.avisar()
+    except ErrorServicioExterno as e:
+        return jsonify({"error": str(e)}), 500
+    except Exception as e:
+        print(f"Error Agendar Lote: {e}")
+        return jsonify({"error": str(e)}), 500
+    finally:
+        # Cualquier salida devuelve al calendario lo retenido que no se confirmó
+        sin_confirmar = retenidos - confirmados
+        if token and sin_confirmar:
+            liberar_slots(token, list(sin_confirmar))
+
+    metricas.registrar("agendar_lote", tiempos.cerrar())
+    return jsonify({
+        "resultados": resultados,
+        "agendadas": len(agendadas),
+        "fallidas": len(items) - len(agendadas)
+    }), 200, {"Server-Timing": tiempos.server_timing()}
 
 # --- 4. ENDPOINT: LISTAR CON FILTROS ---
+# Sin 'cursor' ni 'limite' la respuesta es la lista completa, como siempre.
+# Con cualquiera de los dos se pagina: {"items": [...], "siguienteCursor": ...}
+LIMITE_POR_DEFECTO = 50
+LIMITE_MAXIMO = 200
+
 @controller.route('/', methods=['GET'])
 def listar_citas():
-    # Recibimos los filtros desde la URL (?fecha=...&pacienteId=...)
-    fecha = request.args.get('fecha')
-    medico_nombre = request.args.get('medico') # Opcional si decides usarlo a futuro
-    paciente_id = request.args.get('pacienteId')
-    
+    # Recibimos los filtros desde la URL (?fecha=...&pacienteId=...&cursor=...)
+    args = request.args
+    paginado = 'cursor' in args or 'limite' in args
+    limite = None
+    if paginado:
+        try:
+            limite = min(max(int(args.get('limite', LIMITE_POR_DEFECTO)), 1), LIMITE_MAXIMO)
+        except ValueError:
+            return jsonify({"error": "'limite' debe ser un número"}), 400
+
     try:
-        # Usamos el repo para buscar
-        # Nota: Asegúrate de que tu Repo tenga el método find_by_filters actualizado
-        citas = repo.find_by_filters(fecha, medico_nombre, paciente_id)
-        
-        # Convertimos la lista de objetos a lista de diccionarios JSON
-        return jsonify([cita_to_dict(c) for c in citas]), 200
+        citas, siguiente = repo.find_by_filters(
+            fecha=args.get('fecha'),
+            medico_nombre=args.get('medico'),
+            paciente_id=args.get('pacienteId'),
+            medico_id=args.get('medicoId'),
+            estado=args.get('estado'),
+            fecha_desde=args.get('fechaDesde'),
+            fecha_hasta=args.get('fechaHasta'),
+            cursor=args.get('cursor'),
+            limite=limite
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+    if not paginado:
+        return jsonify([cita_to_dict(c) for c in citas]), 200
+    # siguienteCursor = null en la última página
+    return jsonify({
+        "items": [cita_to_dict(c) for c in citas],
+        "siguienteCursor": siguiente
+    }), 200
+
 # --- 5. ENDPOINT: ANULAR CITA ---
 @controller.route('/anular/<id>', methods=['PATCH'])
 def anular_cita(id):
@@ -137,22 +318,22 @@ def anular_cita(id):
         # Esto cambia el estado a ANULADA y actualiza el motivo
         cita.anular(motivo)
         
-        # C. Guardar cambios
-        repo.save(cita)
-        
-        # D. Notificar Cancelación
-        evento = {
-            "citaId": str(cita.id),
-            "pacienteId": str(cita.paciente.id), # ¡Importante!
-            "destinatario": cita.paciente.email,
-            "asunto": "Cita Anulada",
-            "mensaje": f"Su cita del {cita.fechaHora} ha sido ANULADA. Motivo: {motivo}",
-            "tipo": "EMAIL"
-        }
-        publicar_evento(evento)
+        # C. Guardar cambios + D. Notificar Cancelación (outbox, misma transacción)
+        repo.update(cita, [evento_cita_anulada(cita, motivo)])
+        relay.avisar()
 
         return jsonify({"mensaje": "Cita anulada correctamente"}), 200
 
     except Exception as e:
         print(f"Error Anular: {e}")
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+# --- 6. ENDPOINT: MÉTRICAS DE TIEMPO POR FASE ---
+@controller.route('/metricas', methods=['GET'])
+def obtener_metricas():
+    return jsonify(metricas.resumen()), 200
+
+# --- 7. ENDPOINT: ESTADO DEL PUBLICADOR DE EVENTOS ---
+@controller.route('/metricas/publicador', methods=['GET'])
+def estado_publicador():
+    return jsonify({**publicador.estadisticas(), "outbox": relay.estadisticas()}), 200
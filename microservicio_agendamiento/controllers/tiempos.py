@@ -0,0 +1,61 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Tiempo por fase de cada petición (p. ej. consultas, reserva, guardado, publicación).
+# Se devuelve en la cabecera Server-Timing y se acumula para GET /metricas.
+
+class Cronometro:
+    def __init__(self):
+        self.fases = {}
+        self._inicio = time.perf_counter()
+
+    @contextmanager
+    def fase(self, nombre):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.fases[nombre] = (time.perf_counter() - inicio) * 1000
+
+    def medir(self, nombre, funcion, *args):
+        """Ejecuta funcion(*args) registrando su duración (sirve dentro de hilos)"""
+        with self.fase(nombre):
+            return funcion(*args)
+
+    def cerrar(self):
+        self.fases["total"] = (time.perf_counter() - self._inicio) * 1000
+        return self
+
+    def server_timing(self):
+        return ", ".join(f"{nombre};dur={ms:.1f}" for nombre, ms in self.fases.items())
+
+class MetricasFases:
+    """Acumulado por operación y fase: cantidad, promedio y máximo en ms"""
+
+    def __init__(self):
+        self._datos = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, operacion, cronometro: Cronometro):
+        with self._lock:
+            fases = self._datos.setdefault(operacion, {})
+            for nombre, ms in cronometro.fases.items():
+                f = fases.setdefault(nombre, {"cantidad": 0, "totalMs": 0.0, "maxMs": 0.0})
+                f["cantidad"] += 1
+                f["totalMs"] += ms
+                f["maxMs"] = max(f["maxMs"], ms)
+
+    def resumen(self):
+        with self._lock:
+            return {
+                operacion: {
+                    nombre: {
+                        "cantidad": f["cantidad"],
+                        "promedioMs": round(f["totalMs"] / f["cantidad"], 2),
+                        "maxMs": round(f["maxMs"], 2)
+                    } for nombre, f in fases.items()
+                } for operacion, fases in self._datos.items()
+            }
+
+metricas = MetricasFases()
@@ -1,11 +1,17 @@
-from flask import Flask
+from flask import Flask, jsonify
 from flask_cors import CORS
-from controllers.cita_controller import controller
+from controllers.cita_controller import controller, relay
 
 app = Flask(__name__)
 CORS(app)
 
 app.register_blueprint(controller)
 
+# Chequeo de salud usado por el balanceador del gateway
+@app.route('/health', methods=['GET'])
+def health():
+    return jsonify({"estado": "OK"}), 200
+
 if __name__ == '__main__':
+    relay.iniciar()  # envía al broker los eventos guardados en la outbox
     app.run(host='0.0.0.0', port=5001)
\ No newline at end of file
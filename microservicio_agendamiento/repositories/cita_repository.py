@@ -1,4 +1,8 @@
+import base64
+import json
 import sqlite3
+import time
+from datetime import date, timedelta
 from domain.models import Cita, PacienteRef, MedicoRef, EstadoCita
 
 class SQLiteCitaRepository:
@@ -24,9 +28,37 @@ class SQLiteCitaRepository:
                     medico_especialidad TEXT
                 )
             ''')
+            # Outbox: eventos pendientes de enviar al broker, escritos en la
+            # misma transacción que la cita (ver clients/relay_outbox.py)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    payload TEXT NOT NULL,
+                    creado_en REAL NOT NULL,
+                    intentos INTEGER NOT NULL DEFAULT 0,
+                    proximo_intento REAL NOT NULL DEFAULT 0
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_outbox_proximo ON outbox (proximo_intento)')
+            # Índices del listado: cada filtro de igualdad + el orden (fecha_hora, id)
+            # para que la paginación por cursor no tenga que ordenar en memoria
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_citas_fecha ON citas (fecha_hora, id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_citas_paciente ON citas (paciente_id, fecha_hora, id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_citas_medico ON citas (medico_id, fecha_hora, id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_citas_estado ON citas (estado, fecha_hora, id)')
+            # El nombre del médico se busca por coincidencia parcial: recorre idx_citas_fecha
+            # en orden y filtra, así que un índice por nombre no se usaría
+            cursor.execute('DROP INDEX IF EXISTS idx_citas_medico_nombre')
             conn.commit()
 
-    def save(self, cita: Cita):
+    def _encolar_eventos(self, cursor, eventos):
+        ahora = time.time()
+        cursor.executemany(
+            'INSERT INTO outbox (payload, creado_en, proximo_intento) VALUES (?,?,?)',
+            [(json.dumps(e), ahora, ahora) for e in eventos])
+
+    def save(self, cita: Cita, eventos=()):
+        """Guarda la cita y sus eventos en una sola transacción"""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute('''
@@ -36,34 +68,164 @@ class SQLiteCitaRepository:
                 str(cita.paciente.id), cita.paciente.nombre, cita.paciente.email, cita.paciente.telefono,
                 str(cita.medico.id), cita.medico.nombre, cita.medico.especialidad
             ))
+            self._encolar_eventos(cursor, eventos)
             conn.commit()
         return cita
 
+    def save_lote(self, citas, eventos=()):
+        """Guarda varias citas y sus eventos con un solo executemany y un solo commit"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT INTO citas VALUES (?,?,?,?,?,?,?,?,?,?,?)
+            ''', [(
+                str(c.id), c.fechaHora, c.motivo, c.estado.value,
+                str(c.paciente.id), c.paciente.nombre, c.paciente.email, c.paciente.telefono,
+                str(c.medico.id), c.medico.nombre, c.medico.especialidad
+            ) for c in citas])
+            self._encolar_eventos(cursor, eventos)
+            conn.commit()
+        return citas
+
     def find_by_id(self, cita_id: str):
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT * FROM citas WHERE id = ?', (cita_id,))
             row = cursor.fetchone()
             if not row: return None
+            return self._row_to_cita(row)
+
+    # --- LISTADO CON FILTROS (paginado por cursor) ---
+    def find_by_filters(self, fecha=None, medico_nombre=None, paciente_id=None, medico_id=None,
+                        estado=None, fecha_desde=None, fecha_hasta=None, cursor=None, limite=50):
+        """Devuelve (citas, siguiente_cursor) ordenadas por (fecha_hora, id).
+        El cursor es la última (fecha_hora, id) entregada: cada página es un
+        rango del índice, sin OFFSET, así que cuesta lo mismo la página 1 que la 1000.
+        Con limite=None se devuelven todas (siguiente_cursor siempre None)."""
+        condiciones, valores = [], []
+        if fecha:
+            fecha_desde, fecha_hasta = fecha, fecha
+        if fecha_desde:
+            condiciones.append('fecha_hora >= ?')
+            valores.append(fecha_desde)
+        if fecha_hasta:
+            # Una fecha sin hora incluye todo ese día
+            if len(fecha_hasta) == 10:
+                condiciones.append('fecha_hora < ?')
+                valores.append((date.fromisoformat(fecha_hasta) + timedelta(days=1)).isoformat())
+            else:
+                condiciones.append('fecha_hora <= ?')
+                valores.append(fecha_hasta)
+        if paciente_id:
+            condiciones.append('paciente_id = ?')
+            valores.append(paciente_id)
+        if medico_id:
+            condiciones.append('medico_id = ?')
+            valores.append(medico_id)
+        if estado:
+            condiciones.append('estado = ?')
+            valores.append(estado)
+        if medico_nombre:
+            # Coincidencia parcial sin distinguir mayúsculas. Las filas salen en el
+            # orden del índice (fecha_hora, id): se filtran sin ordenar en memoria
+            condiciones.append("medico_nombre LIKE ? ESCAPE '\\'")
+            literal = medico_nombre.strip().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            valores.append(f"%{literal}%")
+        if cursor:
+            condiciones.append('(fecha_hora, id) > (?, ?)')
+            valores.extend(self._decodificar_cursor(cursor))
 
-            # Reconstrucción (Mapping)
-            # Row index: 0:id, 1:fecha, 2:motivo, 3:estado, 
-            # 4:p_id, 5:p_nom, 6:p_mail, 7:p_tel
-            # 8:m_id, 9:m_nom, 10:m_esp
-            
-            p_ref = PacienteRef(row[4], row[5], row[6], row[7])
-            m_ref = MedicoRef(row[8], row[9], row[10])
-            
-            cita = Cita(row[1], row[2], p_ref, m_ref)
-            cita.id = row[0] # UUID original
-            cita.estado = EstadoCita(row[3])
-            
-            return cita
-
-    def update(self, cita: Cita):
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ''
+        with sqlite3.connect(self.db_path) as conn:
+            cur = conn.cursor()
+            # Se pide una fila de más para saber si hay otra página
+            cur.execute(f'SELECT * FROM citas {where} ORDER BY fecha_hora, id LIMIT ?',
+                        valores + [-1 if limite is None else limite + 1])
+            rows = cur.fetchall()
+
+        siguiente = None
+        if limite is not None and len(rows) > limite:
+            rows = rows[:limite]
+            siguiente = self._codificar_cursor(rows[-1][1], rows[-1][0])
+        return [self._row_to_cita(r) for r in rows], siguiente
+
+    def _codificar_cursor(self, fecha_hora, cita_id):
+        return base64.urlsafe_b64encode(json.dumps([fecha_hora, cita_id]).encode()).decode()
+
+    def _decodificar_cursor(self, cursor):
+        """[fecha_hora, id] tal como lo arma _codificar_cursor; cualquier otra forma es ValueError"""
+        try:
+            marca = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (ValueError, TypeError):
+            raise ValueError("Cursor inválido")
+        if not isinstance(marca, list) or len(marca) != 2 or not all(isinstance(v, str) for v in marca):
+            raise ValueError("Cursor inválido")
+        return marca[0], marca[1]
+
+    # Reconstrucción (Mapping)
+    # Row index: 0:id, 1:fecha, 2:motivo, 3:estado,
+    # 4:p_id, 5:p_nom, 6:p_mail, 7:p_tel
+    # 8:m_id, 9:m_nom, 10:m_esp
+    def _row_to_cita(self, row):
+        p_ref = PacienteRef(row[4], row[5], row[6], row[7])
+        m_ref = MedicoRef(row[8], row[9], row[10])
+
+        cita = Cita(row[1], row[2], p_ref, m_ref)
+        cita.id = row[0] # UUID original
+        cita.estado = EstadoCita(row[3])
+        return cita
+
+    def update(self, cita: Cita, eventos=()):
+        """Actualiza la cita y encola sus eventos en una sola transacción"""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 UPDATE citas SET fecha_hora = ?, estado = ?, motivo = ? WHERE id = ?
             ''', (cita.fechaHora, cita.estado.value, cita.motivo, str(cita.id)))
-            conn.commit()
\ No newline at end of file
+            self._encolar_eventos(cursor, eventos)
+            conn.commit()
+
+    def update_lote(self, citas, eventos=()):
+        """Actualiza varias citas y encola sus eventos en una sola transacción"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                UPDATE citas SET fecha_hora = ?, estado = ?, motivo = ? WHERE id = ?
+            ''', [(c.fechaHora, c.estado.value, c.motivo, str(c.id)) for c in citas])
+            self._encolar_eventos(cursor, eventos)
+            conn.commit()
+
+    def eliminar(self, cita_ids):
+        """Borra citas que nunca llegaron a confirmarse (no tienen eventos)"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany('DELETE FROM citas WHERE id = ?', [(str(i),) for i in cita_ids])
+            conn.commit()
+
+    # --- OUTBOX ---
+    def eventos_pendientes(self, limite: int):
+        """[(id, evento, intentos)] listos para enviar, del más antiguo al más nuevo"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, payload, intentos FROM outbox
+                WHERE proximo_intento <= ? ORDER BY id LIMIT ?
+            ''', (time.time(), limite))
+            return [(row[0], json.loads(row[1]), row[2]) for row in cursor.fetchall()]
+
+    def eliminar_eventos(self, ids):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany('DELETE FROM outbox WHERE id = ?', [(i,) for i in ids])
+            conn.commit()
+
+    def posponer_eventos(self, reintentos):
+        """reintentos: [(id, segundos de espera)]"""
+        ahora = time.time()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany(
+                'UPDATE outbox SET intentos = intentos + 1, proximo_intento = ? WHERE id = ?',
+                [(ahora + espera, i) for i, espera in reintentos])
+            conn.commit()
+
+    def contar_eventos_pendientes(self):
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute('SELECT COUNT(*) FROM outbox').fetchone()[0]
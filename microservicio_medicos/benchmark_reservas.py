@@ -0,0 +1,74 @@
+# Benchmark: reservas concurrentes desde varios procesos sobre pocos slots "calientes"
+# Uso: python benchmark_reservas.py -n 2000 -m 20 -p 8
+# Trabaja sobre una base temporal; no toca medicos.db
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from datetime import date, time as hora, timedelta
+from multiprocessing import Pool
+from domain.models import Medico, HorarioConfiguracion, SlotAgenda, DiaSemana
+from repositories.medico_repository import SQLiteMedicoRepository
+
+def preparar(db_path, slots_calientes):
+    """Un médico con un horario de lunes y `slots_calientes` slots con fecha"""
+    repo = SQLiteMedicoRepository(db_path)
+    medico = Medico("Bench", "Reservas", "General")
+    repo.save(medico)
+    horario = HorarioConfiguracion(medico.id, DiaSemana.LUNES, hora(0, 0), hora(23, 55), 5)
+    repo.save_horario_completo(horario)
+
+    lunes = date.today() + timedelta(days=(7 - date.today().weekday()) % 7)
+    # Con más slots que un día, se reparten en lunes sucesivos
+    return [SlotAgenda.idFechado(horario.id, lunes + timedelta(weeks=i // horario.cantidadSlots()),
+                                 i % horario.cantidadSlots())
+            for i in range(slots_calientes)]
+
+def trabajador(args):
+    db_path, slot_ids = args
+    repo = SQLiteMedicoRepository(db_path)
+    exitos, conflictos, errores = [], 0, 0
+    for slot_id in slot_ids:
+        try:
+            if repo.reservar_slot(slot_id):
+                exitos.append(slot_id)
+            else:
+                conflictos += 1
+        except Exception:
+            errores += 1  # p. ej. 'database is locked'
+    return exitos, conflictos, errores
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de reservas concurrentes de slots")
+    parser.add_argument("-n", "--total", type=int, default=2000, help="Intentos de reserva")
+    parser.add_argument("-m", "--slots", type=int, default=20, help="Slots calientes (disputados)")
+    parser.add_argument("-p", "--procesos", type=int, default=8, help="Procesos simultáneos")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        db_path = os.path.join(carpeta, "bench_medicos.db")
+        slots = preparar(db_path, args.slots)
+        intentos = [random.choice(slots) for _ in range(args.total)]
+        lotes = [(db_path, intentos[i::args.procesos]) for i in range(args.procesos)]
+
+        inicio = time.perf_counter()
+        with Pool(args.procesos) as pool:
+            resultados = pool.map(trabajador, lotes)
+        duracion = time.perf_counter() - inicio
+
+        exitos = Counter(s for r in resultados for s in r[0])
+        conflictos = sum(r[1] for r in resultados)
+        errores = sum(r[2] for r in resultados)
+        dobles = sum(1 for veces in exitos.values() if veces > 1)
+
+    print(f"Intentos: {args.total} | slots calientes: {args.slots} | procesos: {args.procesos}")
+    print(f"Reservas/s:        {args.total / duracion:.1f}")
+    print(f"Reservados:        {sum(exitos.values())} (de {len(set(intentos))} slots pedidos)")
+    print(f"Conflictos:        {conflictos}")
+    print(f"Errores:           {errores}")
+    print(f"Dobles reservas:   {dobles}")
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,18 @@
 from flask import Blueprint, request, jsonify
 from domain.models import Medico, HorarioConfiguracion, DiaSemana
 from repositories.medico_repository import SQLiteMedicoRepository
-from datetime import datetime
+from repositories.indice_disponibilidad import IndiceDisponibilidad
+from datetime import datetime, timedelta
+import os
 import uuid
 
 controller = Blueprint('medico_controller', __name__)
 repo = SQLiteMedicoRepository()
+indice = IndiceDisponibilidad(repo)
+
+MAX_IDS_POR_LOTE = 500
+TTL_RETENCION = float(os.getenv("MEDICOS_TTL_RETENCION", "180"))
+TTL_RETENCION_MAX = 900
 
 # --- 1. CREAR MÉDICO ---
 @controller.route('/crear', methods=['POST'])
@@ -14,16 +21,31 @@ def crear_medico():
     try:
         medico = Medico(data['nombre'], data['apellido'], data['especialidad'])
         repo.save(medico)
+        indice.medico_creado(medico)
         return jsonify({"id": str(medico.id), "mensaje": "Médico creado correctamente"}), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 # --- 2. CONFIGURAR HORARIO ---
+def _validar_rango(config: HorarioConfiguracion):
+    """Mismas reglas en /configurar-horario y /configurar-horarios, antes de guardar"""
+    if config.duracionCita <= 0 or config.horaFin <= config.horaInicio:
+        raise ValueError("horaFin debe ser posterior a horaInicio y la duración positiva")
+    if config.cantidadSlots() == 0:
+        raise ValueError("El rango no alcanza para un slot")
+
+def _rango(horario):
+    return f"{horario.horaInicio.strftime('%H:%M')}-{horario.horaFin.strftime('%H:%M')}"
+
+def _conflicto(nuevo, otro):
+    return {"medicoId": str(nuevo.medicoId), "dia": nuevo.dia.value,
+            "horario": _rango(nuevo), "seCruzaCon": _rango(otro)}
+
 @controller.route('/configurar-horario', methods=['POST'])
 def configurar_horario():
     data = request.json
     try:
-        medico = repo.find_by_id(data['medicoId'])
+        medico = repo.find_by_id(data['medicoId'], con_slots=False)
         if not medico: return jsonify({"error": "Médico no encontrado"}), 404
         
         # Conversión de datos
@@ -32,22 +54,95 @@ def configurar_horario():
         h_fin = datetime.strptime(data['horaFin'], "%H:%M").time()
         duracion = int(data['duracion'])
         
-        # Crear Configuración y Generar Slots (Dominio)
+        # Crear Configuración (Dominio): los slots con fecha se derivan de la plantilla
         config = HorarioConfiguracion(medico.id, dia_enum, h_inicio, h_fin, duracion)
-        slots_generados = config.generarSlots()
+        _validar_rango(config)
         
-        # Persistencia
-        repo.save_horario_completo(config)
+        # Persistencia: mismo camino que el alta masiva, con la validación de cruces
+        # contra los horarios ya guardados dentro de la transacción
+        cruces = repo.save_horarios([config])
+        if cruces:
+            return jsonify({"error": "Horario superpuesto con los ya configurados",
+                            "conflictos": [_conflicto(nuevo, guardado) for nuevo, guardado in cruces]}), 409
+        indice.horario_configurado(config)
         
         return jsonify({
             "mensaje": "Horario configurado",
-            "slots_creados": len(slots_generados),
+            "slots_creados": config.cantidadSlots(),
             "dia": dia_enum.value
         }), 200
         
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+# --- 2.1 CONFIGURAR HORARIOS EN LOTE (varios días y médicos) ---
+MAX_HORARIOS_POR_LOTE = 5000
+
+@controller.route('/configurar-horarios', methods=['POST'])
+def configurar_horarios():
+    """{"horarios": [{"medicoId", "dia" | "dias": [...], "horaInicio", "horaFin", "duracion"}]}
+    Todo o nada: si un rango es inválido o se cruza con otro no se guarda ninguno."""
+    data = request.get_json(silent=True)
+    items = data.get('horarios') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Se requiere un objeto con la lista 'horarios'"}), 400
+
+    # 1. Validación de formato y expansión de 'dias'
+    horarios, errores = [], []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            errores.append({"indice": i, "error": "Cada horario debe ser un objeto"})
+            continue
+        try:
+            dias = item.get('dias') or [item['dia']]
+            if not isinstance(dias, list) or not all(isinstance(d, str) for d in dias):
+                raise ValueError("'dia' debe ser un día (ej: \"LUNES\") y 'dias' una lista de días")
+            h_inicio = datetime.strptime(item['horaInicio'], "%H:%M").time()
+            h_fin = datetime.strptime(item['horaFin'], "%H:%M").time()
+            duracion = int(item['duracion'])
+            for dia in dias:
+                config = HorarioConfiguracion(str(item['medicoId']), DiaSemana(dia), h_inicio, h_fin, duracion)
+                _validar_rango(config)
+                horarios.append((i, config))
+        except (KeyError, TypeError, AttributeError):
+            errores.append({"indice": i, "error": "Faltan medicoId, dia/dias, horaInicio, horaFin o duracion"})
+        except ValueError as e:
+            errores.append({"indice": i, "error": str(e)})
+    if len(horarios) > MAX_HORARIOS_POR_LOTE:
+        return jsonify({"error": f"Máximo {MAX_HORARIOS_POR_LOTE} horarios por lote"}), 400
+
+    # 2. Médicos existentes (una consulta por lote de ids)
+    medico_ids = list({h.medicoId for _, h in horarios})
+    existentes = {str(m.id) for m in repo.find_by_ids(medico_ids)}
+    errores.extend({"indice": i, "error": f"Médico {h.medicoId} no encontrado"}
+                   for i, h in horarios if h.medicoId not in existentes)
+    if errores:
+        return jsonify({"error": "Horarios inválidos", "detalle": sorted(errores, key=lambda e: e["indice"])}), 400
+
+    # 3. Cruces dentro del propio lote, en memoria
+    horarios = [h for _, h in horarios]
+    cruces = HorarioConfiguracion.buscarSolapamientos(horarios)
+    if cruces:
+        return jsonify({"error": "Horarios superpuestos en el lote",
+                        "conflictos": [_conflicto(b, a) for a, b in cruces]}), 409
+
+    # 4. Persistencia: una transacción, cruces con lo ya guardado validados dentro de ella
+    try:
+        cruces = repo.save_horarios(horarios)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if cruces:
+        return jsonify({"error": "Horarios superpuestos con los ya configurados",
+                        "conflictos": [_conflicto(nuevo, guardado) for nuevo, guardado in cruces]}), 409
+
+    for config in horarios:
+        indice.horario_configurado(config)
+    return jsonify({
+        "mensaje": "Horarios configurados",
+        "horariosCreados": len(horarios),
+        "slotsCreados": sum(h.cantidadSlots() for h in horarios)
+    }), 201
+
 # --- 3. OBTENER DISPONIBILIDAD (IMPLEMENTADO) ---
 @controller.route('/disponibilidad', methods=['GET'])
 def obtener_disponibilidad():
@@ -58,16 +153,17 @@ def obtener_disponibilidad():
         if not medico_id or not fecha_str:
             return jsonify({"error": "Faltan parámetros medicoId o fecha"}), 400
             
-        # 1. Recuperar Agregado Completo
-        medico = repo.find_by_id(medico_id)
+        # 1. Convertir Fecha
+        fecha_consulta = datetime.strptime(fecha_str, '%Y-%m-%d').date()
+
+        # 2. Recuperar el Agregado (plantillas de ese día de la semana) y las reservas de esa fecha
+        medico = repo.find_by_id(medico_id, dia=Medico.diaDe(fecha_consulta), con_slots=False)
         if not medico:
             return jsonify({"error": "Médico no encontrado"}), 404
-            
-        # 2. Convertir Fecha
-        fecha_consulta = datetime.strptime(fecha_str, '%Y-%m-%d').date()
+        ocupacion = repo.ocupacion_del_dia(medico_id, fecha_consulta)
         
-        # 3. Consultar al Dominio
-        slots = medico.getDisponibilidad(fecha_consulta)
+        # 3. Consultar al Dominio (slots de la fecha derivados de la plantilla + bitmap)
+        slots = medico.getDisponibilidad(fecha_consulta, ocupacion)
         
         # 4. Respuesta (DTO simplificado)
         response = []
@@ -84,6 +180,37 @@ def obtener_disponibilidad():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# --- 3.1 PRÓXIMOS SLOTS LIBRES (por especialidad o lista de médicos) ---
+MAX_RESULTADOS = 100
+MAX_DIAS_BUSQUEDA = 180
+
+@controller.route('/proximos-disponibles', methods=['GET'])
+def proximos_disponibles():
+    """?especialidad=...|medicoIds=a,b  &desde=AAAA-MM-DD &hasta=AAAA-MM-DD &k=10"""
+    hoy = datetime.now().date()
+    try:
+        # Un 'desde' pasado se toma como hoy: no se ofrecen slots que ya ocurrieron
+        desde = datetime.strptime(request.args['desde'], '%Y-%m-%d').date() \
+            if request.args.get('desde') else hoy
+        hasta = datetime.strptime(request.args['hasta'], '%Y-%m-%d').date() \
+            if request.args.get('hasta') else max(desde, hoy) + timedelta(days=30)
+        k = min(max(int(request.args.get('k', 10)), 1), MAX_RESULTADOS)
+    except ValueError:
+        return jsonify({"error": "Fechas en formato AAAA-MM-DD y 'k' numérico"}), 400
+    if hasta < desde or (hasta - max(desde, hoy)).days > MAX_DIAS_BUSQUEDA:
+        return jsonify({"error": f"El rango debe ir hacia adelante y cubrir como máximo {MAX_DIAS_BUSQUEDA} días"}), 400
+
+    especialidad = request.args.get('especialidad')
+    ids_param = request.args.get('medicoIds')
+    medico_ids = [i.strip() for i in ids_param.split(',') if i.strip()] if ids_param else None
+    if not especialidad and not medico_ids:
+        return jsonify({"error": "Indique 'especialidad' o 'medicoIds'"}), 400
+
+    try:
+        return jsonify(indice.proximos(desde, hasta, k, especialidad, medico_ids)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 # --- 4. RESERVAR SLOT (NECESARIO PARA AGENDAMIENTO) ---
 @controller.route('/reservar-slot/<slot_id>', methods=['PATCH'])
 def reservar_slot(slot_id):
@@ -99,7 +226,151 @@ def reservar_slot(slot_id):
             return jsonify({"error": "No se pudo reservar o slot no encontrado"}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    
+
+# --- 4.1 RESERVAR VARIOS SLOTS (agendamiento por lote) ---
+@controller.route('/reservar-slots', methods=['POST'])
+def reservar_slots():
+    data = request.get_json(silent=True)
+    slot_ids = data.get('slotIds') if isinstance(data, dict) else None
+    if not isinstance(slot_ids, list) or not slot_ids:
+        return jsonify({"error": "Se espera 'slotIds' con al menos un id"}), 400
+    if len(slot_ids) > MAX_IDS_POR_LOTE:
+        return jsonify({"error": f"Máximo {MAX_IDS_POR_LOTE} slots por lote"}), 400
+    try:
+        slot_ids = [str(i) for i in slot_ids]
+        reservados = repo.reservar_slots(slot_ids)
+        # Un id repetido en el lote solo se reserva la primera vez
+        sin_asignar = set(reservados)
+        no_disponibles = []
+        for slot_id in slot_ids:
+            if slot_id in sin_asignar:
+                sin_asignar.discard(slot_id)
+            else:
+                no_disponibles.append(slot_id)
+        return jsonify({"reservados": reservados, "noDisponibles": no_disponibles}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# --- 4.2 RETENER / CONFIRMAR / LIBERAR SLOT (reserva en dos fases) ---
+# La retención ocupa el slot solo por un tiempo: si nadie la confirma, el
+# barrido (repositories/barrido_retenciones.py) lo devuelve al calendario.
+@controller.route('/retener-slot/<slot_id>', methods=['POST'])
+def retener_slot(slot_id):
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}  # sin cuerpo: ttl por defecto
+    if not isinstance(data, dict):
+        return jsonify({"error": "Se espera un objeto JSON"}), 400
+    try:
+        ttl = min(max(float(data.get('ttl', TTL_RETENCION)), 1), TTL_RETENCION_MAX)
+    except (TypeError, ValueError):
+        return jsonify({"error": "'ttl' debe ser un número de segundos"}), 400
+    try:
+        retencion = repo.retener_slot(slot_id, ttl)
+        if not retencion:
+            return jsonify({"error": "Slot no disponible"}), 409
+        token, expira = retencion
+        return jsonify({
+            "slotId": slot_id,
+            "token": token,
+            "expiraEn": datetime.fromtimestamp(expira).isoformat(timespec='seconds'),
+            "ttl": ttl
+        }), 201
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@controller.route('/confirmar-slot/<slot_id>', methods=['POST'])
+def confirmar_slot(slot_id):
+    data = request.get_json(silent=True)
+    token = data.get('token') if isinstance(data, dict) else None
+    if not token:
+        return jsonify({"error": "Se espera un objeto JSON con 'token'"}), 400
+    try:
+        if repo.confirmar_slot(slot_id, token):
+            return jsonify({"mensaje": "Slot reservado con éxito"}), 200
+        return jsonify({"error": "Retención inexistente o vencida"}), 409
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@controller.route('/liberar-slot/<slot_id>', methods=['POST'])
+def liberar_slot(slot_id):
+    data = request.get_json(silent=True)
+    token = data.get('token') if isinstance(data, dict) else None
+    if not token:
+        return jsonify({"error": "Se espera un objeto JSON con 'token'"}), 400
+    try:
+        if repo.liberar_slot(slot_id, token):
+            return jsonify({"mensaje": "Slot liberado"}), 200
+        return jsonify({"error": "Retención no encontrada"}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# --- 4.3 RETENER / CONFIRMAR / LIBERAR VARIOS SLOTS (agendamiento por lote) ---
+# Un solo token para todo el lote. Con 'medicoIds' (alineado con 'slotIds') se
+# rechazan los slots que no pertenecen al médico indicado.
+def _lote_slots(data):
+    """slotIds del cuerpo como lista de textos, o None si no es válida"""
+    slot_ids = data.get('slotIds') if isinstance(data, dict) else None
+    if not isinstance(slot_ids, list) or not slot_ids or len(slot_ids) > MAX_IDS_POR_LOTE:
+        return None
+    return [str(i) for i in slot_ids]
+
+@controller.route('/retener-slots', methods=['POST'])
+def retener_slots():
+    data = request.get_json(silent=True)
+    slot_ids = _lote_slots(data)
+    if slot_ids is None:
+        return jsonify({"error": f"Se espera 'slotIds' con entre 1 y {MAX_IDS_POR_LOTE} ids"}), 400
+    medico_ids = data.get('medicoIds')
+    if medico_ids is not None and (not isinstance(medico_ids, list) or len(medico_ids) != len(slot_ids)):
+        return jsonify({"error": "'medicoIds' debe tener un id por cada slot"}), 400
+    try:
+        ttl = min(max(float(data.get('ttl', TTL_RETENCION)), 1), TTL_RETENCION_MAX)
+    except (TypeError, ValueError):
+        return jsonify({"error": "'ttl' debe ser un número de segundos"}), 400
+    try:
+        token, expira, retenidos, ajenos = repo.retener_slots(
+            slot_ids, ttl, [str(m) for m in medico_ids] if medico_ids is not None else None)
+        # Un id repetido en el lote solo se retiene la primera vez
+        sin_asignar = set(retenidos)
+        no_disponibles = []
+        for slot_id in slot_ids:
+            if slot_id in sin_asignar:
+                sin_asignar.discard(slot_id)
+            elif slot_id not in ajenos:
+                no_disponibles.append(slot_id)
+        return jsonify({
+            "token": token,
+            "expiraEn": datetime.fromtimestamp(expira).isoformat(timespec='seconds'),
+            "retenidos": retenidos,
+            "ajenos": ajenos,
+            "noDisponibles": no_disponibles
+        }), 201
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@controller.route('/confirmar-slots', methods=['POST'])
+def confirmar_slots():
+    data = request.get_json(silent=True)
+    slot_ids = _lote_slots(data)
+    if slot_ids is None or not data.get('token'):
+        return jsonify({"error": "Se espera 'token' y 'slotIds'"}), 400
+    try:
+        return jsonify({"confirmados": repo.confirmar_slots(data['token'], slot_ids)}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@controller.route('/liberar-slots', methods=['POST'])
+def liberar_slots():
+    data = request.get_json(silent=True)
+    slot_ids = _lote_slots(data)
+    if slot_ids is None or not data.get('token'):
+        return jsonify({"error": "Se espera 'token' y 'slotIds'"}), 400
+    try:
+        return jsonify({"liberados": repo.liberar_slots(data['token'], slot_ids)}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 # Helper para JSON
 def medico_to_dict(m: Medico):
     return {
@@ -109,24 +380,54 @@ def medico_to_dict(m: Medico):
         "especialidad": m.especialidad
     }
 
-# 5. LISTAR TODOS
+# 5. LISTAR TODOS (o solo los de ?ids=a,b,c)
 @controller.route('/', methods=['GET'])
 def listar_todos():
     try:
-        medicos = repo.find_all()
+        ids_param = request.args.get('ids')
+        if ids_param is not None:
+            ids = list(dict.fromkeys(i.strip() for i in ids_param.split(',') if i.strip()))
+            if len(ids) > MAX_IDS_POR_LOTE:
+                return jsonify({"error": f"Máximo {MAX_IDS_POR_LOTE} ids por consulta"}), 400
+            medicos = repo.find_by_ids(ids)
+        else:
+            medicos = repo.find_all()
         return jsonify([medico_to_dict(m) for m in medicos]), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-# 6. BUSCAR
+# 6. BUSCAR (texto completo: prefijos, sin tildes, por relevancia; ?limite=&pagina=)
+LIMITE_BUSQUEDA = 50
+MAX_LIMITE_BUSQUEDA = 200
+
 @controller.route('/buscar', methods=['GET'])
 def buscar_medicos():
     try:
         query = request.args.get('q')
         if not query:
             return jsonify({"error": "Falta parámetro de búsqueda"}), 400
-        
-        medicos = repo.search(query)
-        return jsonify([medico_to_dict(m) for m in medicos]), 200
+        try:
+            limite = min(max(int(request.args.get('limite', LIMITE_BUSQUEDA)), 1), MAX_LIMITE_BUSQUEDA)
+            pagina = max(int(request.args.get('pagina', 1)), 1)
+        except ValueError:
+            return jsonify({"error": "'limite' y 'pagina' deben ser numéricos"}), 400
+
+        # Se pide uno de más para saber si hay otra página sin contar todos los resultados
+        medicos = repo.search(query, limite + 1, (pagina - 1) * limite)
+        respuesta = jsonify([medico_to_dict(m) for m in medicos[:limite]])
+        if len(medicos) > limite:
+            respuesta.headers['X-Siguiente-Pagina'] = str(pagina + 1)
+        return respuesta, 200
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+# 7. OBTENER UNO POR ID
+@controller.route('/<medico_id>', methods=['GET'])
+def obtener_medico(medico_id):
+    try:
+        medicos = repo.find_by_ids([medico_id])
+        if not medicos:
+            return jsonify({"error": "Médico no encontrado"}), 404
+        return jsonify(medico_to_dict(medicos[0])), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
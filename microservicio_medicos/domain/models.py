@@ -33,6 +33,34 @@ class SlotAgenda:
         self.horaFin = horaFin
         self.estado = EstadoSlot.DISPONIBLE
 
+    @classmethod
+    def reconstruir(cls, id, horarioId, horaInicio: time, horaFin: time, estado: EstadoSlot):
+        """Desde la base de datos: conserva el id guardado sin generar uno nuevo"""
+        slot = cls.__new__(cls)
+        slot.id = id
+        slot.horarioId = horarioId
+        slot.horaInicio = horaInicio
+        slot.horaFin = horaFin
+        slot.estado = estado
+        return slot
+
+    # Slots con fecha: no se guardan, se derivan de la plantilla semanal.
+    # Id = "<horarioId>_<AAAAMMDD>_<índice del slot en el horario>"
+    @staticmethod
+    def idFechado(horarioId, fecha: date, indice: int) -> str:
+        return f"{horarioId}_{fecha.strftime('%Y%m%d')}_{indice}"
+
+    @staticmethod
+    def desarmarIdFechado(slot_id: str):
+        """(horarioId, fecha, indice) o None si es un id antiguo (UUID de plantilla)"""
+        partes = slot_id.rsplit('_', 2)
+        if len(partes) != 3:
+            return None
+        try:
+            return partes[0], datetime.strptime(partes[1], '%Y%m%d').date(), int(partes[2])
+        except ValueError:
+            return None
+
     def reservar(self):
         self.estado = EstadoSlot.RESERVADO
 
@@ -49,6 +77,59 @@ class HorarioConfiguracion:
         self.duracionCita = duracionCita
         self.slots: List[SlotAgenda] = []
 
+    @classmethod
+    def reconstruir(cls, id, medicoId, dia: DiaSemana, horaInicio: time, horaFin: time, duracionCita: int):
+        horario = cls.__new__(cls)
+        horario.id = id
+        horario.medicoId = medicoId
+        horario.dia = dia
+        horario.horaInicio = horaInicio
+        horario.horaFin = horaFin
+        horario.duracionCita = duracionCita
+        horario.slots = []
+        return horario
+
+    def _minutoInicio(self) -> int:
+        return self.horaInicio.hour * 60 + self.horaInicio.minute
+
+    def _minutoFin(self) -> int:
+        return self.horaFin.hour * 60 + self.horaFin.minute
+
+    def cantidadSlots(self) -> int:
+        # Plantilla inválida (duración no positiva o fin antes del inicio): ningún slot
+        if not self.duracionCita or self.duracionCita <= 0:
+            return 0
+        return max(0, (self._minutoFin() - self._minutoInicio()) // self.duracionCita)
+
+    @staticmethod
+    def buscarSolapamientos(horarios) -> list:
+        """Pares (a, b) de horarios del mismo médico y día cuyos rangos se cruzan.
+        Ordena por inicio y recorre una vez, recordando el que termina más tarde."""
+        ordenados = sorted(horarios, key=lambda h: (str(h.medicoId), h.dia.value, h._minutoInicio()))
+        pares = []
+        previo = None
+        for horario in ordenados:
+            if (previo is not None and str(previo.medicoId) == str(horario.medicoId)
+                    and previo.dia == horario.dia and horario._minutoInicio() < previo._minutoFin()):
+                pares.append((previo, horario))
+                if horario._minutoFin() <= previo._minutoFin():
+                    continue
+            previo = horario
+        return pares
+
+    def slotsDeFecha(self, fecha: date, ocupados: int = 0) -> List[SlotAgenda]:
+        """Slots concretos de una fecha. `ocupados` es el bitmap del día: bit i = slot i reservado"""
+        inicio = self._minutoInicio()
+        slots = []
+        for i in range(self.cantidadSlots()):
+            desde = inicio + i * self.duracionCita
+            hasta = desde + self.duracionCita
+            estado = EstadoSlot.RESERVADO if (ocupados >> i) & 1 else EstadoSlot.DISPONIBLE
+            slots.append(SlotAgenda.reconstruir(
+                SlotAgenda.idFechado(self.id, fecha, i), self.id,
+                time(desde // 60, desde % 60), time(hasta // 60, hasta % 60), estado))
+        return slots
+
     def generarSlots(self):
         """Método del diagrama: Genera la lista de Slots según la duración"""
         self.slots = []
@@ -78,15 +159,31 @@ class Medico:
         # Relación 1 a n
         self.horarios: List[HorarioConfiguracion] = [] 
 
-    def getDisponibilidad(self, fecha: date) -> List[SlotAgenda]:
-        """Método del diagrama: Filtra slots según la fecha consultada"""
-        # Mapeo de Python weekday (0=Lunes) a nuestro Enum
-        dias_str = ["LUNES", "MARTES", "MIERCOLES", "JUEVES", "VIERNES", "SABADO", "DOMINGO"]
-        dia_buscado = dias_str[fecha.weekday()]
-        
+    @classmethod
+    def reconstruir(cls, id, especialidadId, nombre: str, apellido: str, especialidad: str):
+        medico = cls.__new__(cls)
+        medico.id = id
+        medico.especialidadId = especialidadId
+        medico.nombre = nombre
+        medico.apellido = apellido
+        medico.especialidad = especialidad
+        medico.horarios = []
+        return medico
+
+    @staticmethod
+    def diaDe(fecha: date) -> DiaSemana:
+        # Python weekday (0=Lunes) coincide con el orden del Enum
+        return list(DiaSemana)[fecha.weekday()]
+
+    def getDisponibilidad(self, fecha: date, ocupacion: dict = None) -> List[SlotAgenda]:
+        """Método del diagrama: slots de la fecha consultada, derivados de los horarios
+        de ese día de la semana. `ocupacion`: {horarioId: bitmap de slots reservados}"""
+        dia_buscado = Medico.diaDe(fecha)
+        ocupacion = ocupacion or {}
+
         slots_disponibles = []
         for horario in self.horarios:
-            if horario.dia.value == dia_buscado:
-                slots_disponibles.extend(horario.slots)
-        
-        return slots_disponibles
\ No newline at end of file
+            if horario.dia == dia_buscado:
+                slots_disponibles.extend(horario.slotsDeFecha(fecha, ocupacion.get(str(horario.id), 0)))
+
+        return slots_disponibles
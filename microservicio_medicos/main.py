@@ -1,12 +1,19 @@
-from flask import Flask
+from flask import Flask, jsonify
 from flask_cors import CORS 
-from controllers.medico_controller import controller
+from controllers.medico_controller import controller, repo
+from repositories.barrido_retenciones import iniciar_barrido
 
 app = Flask(__name__)
 CORS(app)  
 
 app.register_blueprint(controller)
 
+# Chequeo de salud usado por el balanceador del gateway
+@app.route('/health', methods=['GET'])
+def health():
+    return jsonify({"estado": "OK"}), 200
+
 if __name__ == '__main__':
+    iniciar_barrido(repo)  # libera los slots retenidos que nadie confirmó
     # Puerto 5002 según tu configuración de Docker
     app.run(host='0.0.0.0', port=5002)
\ No newline at end of file
@@ -0,0 +1,19 @@
+import os
+import threading
+import time
+
+INTERVALO_BARRIDO = float(os.getenv("MEDICOS_INTERVALO_BARRIDO", "5"))
+
+def _bucle_barrido(repo):
+    while True:
+        try:
+            soltadas = repo.barrer_retenciones()
+            if soltadas:
+                print(f" [x] Retenciones vencidas liberadas: {soltadas}", flush=True)
+        except Exception as e:
+            print(f" [!] Error en barrido de retenciones: {e}", flush=True)
+        time.sleep(INTERVALO_BARRIDO)
+
+def iniciar_barrido(repo):
+    """Hilo que devuelve al calendario los slots cuyas retenciones vencieron"""
+    threading.Thread(target=_bucle_barrido, args=(repo,), name="barrido-retenciones", daemon=True).start()
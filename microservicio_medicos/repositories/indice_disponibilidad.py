@@ -0,0 +1,115 @@
+import threading
+import unicodedata
+from datetime import date, datetime, timedelta
+from domain.models import SlotAgenda, DiaSemana
+
+DIAS = list(DiaSemana)  # LUNES..DOMINGO, mismo orden que date.weekday()
+
+def normalizar(texto: str) -> str:
+    """Minúsculas y sin tildes: 'Diagnóstico' == 'diagnostico'"""
+    sin_tildes = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in sin_tildes if not unicodedata.combining(c)).casefold().strip()
+
+class IndiceDisponibilidad:
+    """Índice en memoria de las plantillas semanales de todos los médicos.
+
+    Las plantillas cambian poco (crear médico, configurar horario) y se
+    actualizan aquí de forma incremental. Las reservas no se copian a memoria:
+    se leen del bitmap de ocupación con una consulta por búsqueda, así el
+    resultado es el mismo en todas las réplicas del servicio."""
+
+    def __init__(self, repo):
+        self.repo = repo
+        self._lock = threading.Lock()
+        self._firma = None        # (cantidad de médicos, cantidad de horarios) cargados
+        self._medicos = {}        # medicoId -> {"nombre", "especialidad", "clave"}
+        self._plantillas = {}     # medicoId -> 7 listas (LUNES..DOMINGO) de (horarioId, minuto inicio, duración, cantidad)
+
+    # --- MANTENIMIENTO ---
+    def _vigente(self):
+        """Recarga todo si otra réplica creó médicos u horarios que este proceso no vio"""
+        firma = self.repo.firma_agenda()
+        if firma != self._firma:
+            medicos, horarios = self.repo.cargar_agenda()
+            self._medicos, self._plantillas = {}, {}
+            for medico_id, nombre, apellido, especialidad in medicos:
+                self._agregar_medico(medico_id, f"{nombre} {apellido}", especialidad)
+            for horario_id, medico_id, dia, inicio, duracion, cantidad in horarios:
+                self._agregar_horario(horario_id, medico_id, dia, inicio, duracion, cantidad)
+            self._firma = firma
+
+    def _agregar_medico(self, medico_id, nombre, especialidad):
+        self._medicos[medico_id] = {"nombre": nombre, "especialidad": especialidad, "clave": normalizar(especialidad)}
+        self._plantillas.setdefault(medico_id, [[] for _ in range(7)])
+
+    def _agregar_horario(self, horario_id, medico_id, dia: int, inicio: int, duracion: int, cantidad: int):
+        if medico_id in self._plantillas and cantidad > 0:
+            self._plantillas[medico_id][dia].append((horario_id, inicio, duracion, cantidad))
+            self._plantillas[medico_id][dia].sort(key=lambda p: p[1])
+
+    def medico_creado(self, medico):
+        with self._lock:
+            if self._firma is not None:
+                self._agregar_medico(str(medico.id), f"{medico.nombre} {medico.apellido}", medico.especialidad)
+                self._firma = (self._firma[0] + 1, self._firma[1])
+
+    def horario_configurado(self, horario):
+        with self._lock:
+            if self._firma is not None:
+                self._agregar_horario(str(horario.id), str(horario.medicoId), DIAS.index(horario.dia),
+                                      horario.horaInicio.hour * 60 + horario.horaInicio.minute,
+                                      horario.duracionCita, horario.cantidadSlots())
+                self._firma = (self._firma[0], self._firma[1] + 1)
+
+    # --- BÚSQUEDA ---
+    def proximos(self, desde: date, hasta: date, k: int, especialidad=None, medico_ids=None, ahora=None):
+        """Primeros `k` slots libres entre `desde` y `hasta` (inclusive), en orden de fecha y hora.
+        Un `desde` pasado se toma como hoy: no se ofrecen slots que ya ocurrieron."""
+        ahora = ahora or datetime.now()
+        desde = max(desde, ahora.date())
+        if desde > hasta:
+            return []
+        with self._lock:
+            self._vigente()
+            if medico_ids is not None:
+                candidatos = [m for m in medico_ids if m in self._medicos]
+            else:
+                candidatos = list(self._medicos)
+            if especialidad:
+                clave = normalizar(especialidad)
+                candidatos = [m for m in candidatos if self._medicos[m]["clave"] == clave]
+            plantillas = {m: self._plantillas[m] for m in candidatos}
+            medicos = {m: self._medicos[m] for m in candidatos}
+
+        if not candidatos:
+            return []
+        ocupacion = self.repo.ocupacion_rango(candidatos, desde, hasta)
+        minuto_actual = ahora.hour * 60 + ahora.minute
+
+        resultados = []
+        fecha = desde
+        while fecha <= hasta and len(resultados) < k:
+            del_dia = []
+            clave_fecha = fecha.isoformat()
+            for medico_id, semana in plantillas.items():
+                for horario_id, inicio, duracion, cantidad in semana[fecha.weekday()]:
+                    bits = ocupacion.get((horario_id, clave_fecha), 0)
+                    for i in range(cantidad):
+                        minuto = inicio + i * duracion
+                        if (bits >> i) & 1 or (fecha == ahora.date() and minuto <= minuto_actual):
+                            continue
+                        del_dia.append((minuto, medico_id, horario_id, i, duracion))
+            del_dia.sort()
+            for minuto, medico_id, horario_id, i, duracion in del_dia[:k - len(resultados)]:
+                fin = minuto + duracion
+                resultados.append({
+                    "slotId": SlotAgenda.idFechado(horario_id, fecha, i),
+                    "medicoId": medico_id,
+                    "medico": medicos[medico_id]["nombre"],
+                    "especialidad": medicos[medico_id]["especialidad"],
+                    "fecha": clave_fecha,
+                    "horaInicio": f"{minuto // 60:02d}:{minuto % 60:02d}",
+                    "horaFin": f"{fin // 60:02d}:{fin % 60:02d}"
+                })
+            fecha += timedelta(days=1)
+        return resultados
@@ -1,123 +1,501 @@
+import os
+import re
+import secrets
 import sqlite3
-import uuid
-from datetime import datetime
+import time as reloj
+from contextlib import contextmanager
+from datetime import date, time
+from functools import lru_cache
 from domain.models import Medico, HorarioConfiguracion, SlotAgenda, DiaSemana, EstadoSlot
 
+@lru_cache(maxsize=2048)
+def _hora(texto: str) -> time:
+    """'HH:MM' -> time; hay pocas horas distintas, así que se parsean una sola vez"""
+    horas, minutos = texto.split(':')
+    return time(int(horas), int(minutos))
+
+# Ocupación por fecha: bitmaps en enteros de SQLite (64 bits con signo),
+# 63 slots por palabra para no tocar el bit de signo
+BITS_POR_PALABRA = 63
+
+# Términos de búsqueda: palabras (con tildes) que se consultan como prefijos en FTS5
+_PALABRA = re.compile(r"\w+", re.UNICODE)
+
+# Segundos que una conexión espera un bloqueo de escritura antes de fallar
+BUSY_TIMEOUT = float(os.getenv("MEDICOS_BUSY_TIMEOUT", "5"))
+
 class SQLiteMedicoRepository:
     def __init__(self, db_path="medicos.db"):
         self.db_path = db_path
         self._init_db()
 
+    def _conectar(self):
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT)
+        conn.execute('PRAGMA synchronous=NORMAL')  # seguro con WAL: solo se arriesga el último commit ante un corte de luz
+        return conn
+
+    @contextmanager
+    def _escritura(self):
+        """Transacción que toma el bloqueo de escritura desde el inicio (BEGIN IMMEDIATE).
+        Con una transacción diferida, leer y luego escribir puede fallar con
+        'database is locked' sin esperar si otro proceso escribió entre medio."""
+        conn = self._conectar()
+        conn.isolation_level = None  # BEGIN/COMMIT explícitos
+        try:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                yield cursor
+            except BaseException:
+                cursor.execute('ROLLBACK')
+                raise
+            cursor.execute('COMMIT')
+        finally:
+            conn.close()
+
     def _init_db(self):
-        with sqlite3.connect(self.db_path) as conn:
+        with self._conectar() as conn:
             cursor = conn.cursor()
+            # WAL: las lecturas no bloquean a la escritura ni al revés (el modo queda guardado en el archivo)
+            cursor.execute('PRAGMA journal_mode=WAL')
             # Tablas
+            # fila: alias explícito del rowid (INTEGER PRIMARY KEY) para el índice de texto;
+            # el rowid implícito de una tabla con clave TEXT puede renumerarse con VACUUM
             cursor.execute('''CREATE TABLE IF NOT EXISTS medicos (
-                id TEXT PRIMARY KEY, especialidadId TEXT, nombre TEXT, apellido TEXT, especialidad TEXT)''')
+                id TEXT NOT NULL UNIQUE, especialidadId TEXT, nombre TEXT, apellido TEXT, especialidad TEXT,
+                fila INTEGER PRIMARY KEY)''')
             cursor.execute('''CREATE TABLE IF NOT EXISTS horarios (
                 id TEXT PRIMARY KEY, medicoId TEXT, dia TEXT, horaInicio TEXT, horaFin TEXT, duracion INTEGER)''')
             cursor.execute('''CREATE TABLE IF NOT EXISTS slots (
                 id TEXT PRIMARY KEY, horarioId TEXT, horaInicio TEXT, horaFin TEXT, estado TEXT)''')
+            # Índices para cargar el agregado sin recorrer tablas completas
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_horarios_medico_dia ON horarios (medicoId, dia)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_slots_horario ON slots (horarioId)')
+            # Calendario: una fila por (médico, fecha, horario, palabra) solo cuando hay reservas.
+            # Los slots con fecha se derivan de la plantilla (horarios), no se guardan.
+            cursor.execute('''CREATE TABLE IF NOT EXISTS ocupacion (
+                medicoId TEXT NOT NULL, fecha TEXT NOT NULL, horarioId TEXT NOT NULL,
+                palabra INTEGER NOT NULL, bits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (medicoId, fecha, horarioId, palabra)) WITHOUT ROWID''')
+            # Retenciones: slots ocupados de forma provisoria hasta `expira` (epoch)
+            cursor.execute('''CREATE TABLE IF NOT EXISTS retenciones (
+                slotId TEXT PRIMARY KEY, token TEXT NOT NULL, expira REAL NOT NULL)''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_retenciones_expira ON retenciones (expira)')
             conn.commit()
+            self._migrar_fila_medicos(cursor)
+            self._fts = self._init_busqueda(cursor)
+            conn.commit()
+
+    def _migrar_fila_medicos(self, cursor):
+        """Bases anteriores a la columna `fila`: se reconstruye la tabla conservando los
+        rowid actuales y se borra el índice de texto, que _init_busqueda vuelve a armar"""
+        cursor.execute('PRAGMA table_info(medicos)')
+        if 'fila' in [c[1] for c in cursor.fetchall()]:
+            return
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            # Dentro del bloqueo: otra réplica pudo migrar mientras esta esperaba
+            cursor.execute('PRAGMA table_info(medicos)')
+            if 'fila' not in [c[1] for c in cursor.fetchall()]:
+                cursor.execute('DROP TABLE IF EXISTS medicos_fts')
+                cursor.execute('''CREATE TABLE medicos_migracion (
+                    id TEXT NOT NULL UNIQUE, especialidadId TEXT, nombre TEXT, apellido TEXT, especialidad TEXT,
+                    fila INTEGER PRIMARY KEY)''')
+                cursor.execute('''INSERT INTO medicos_migracion (id, especialidadId, nombre, apellido, especialidad, fila)
+                    SELECT id, especialidadId, nombre, apellido, especialidad, rowid FROM medicos''')
+                # Los triggers del índice se borran junto con la tabla
+                cursor.execute('DROP TABLE medicos')
+                cursor.execute('ALTER TABLE medicos_migracion RENAME TO medicos')
+        except BaseException:
+            cursor.execute('ROLLBACK')
+            raise
+        cursor.execute('COMMIT')
+
+    def _init_busqueda(self, cursor) -> bool:
+        """Índice de texto completo sobre medicos, sincronizado por triggers.
+        unicode61 + remove_diacritics: 'cardiologia' encuentra 'Cardiología'.
+        Devuelve False si el SQLite instalado no trae FTS5 (se busca con LIKE)."""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'medicos_fts'")
+        existia = cursor.fetchone() is not None
+        try:
+            cursor.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS medicos_fts USING fts5(
+                nombre, apellido, especialidad,
+                content='medicos', content_rowid='fila',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3')''')
+        except sqlite3.OperationalError:
+            return False
+        cursor.execute('''CREATE TRIGGER IF NOT EXISTS medicos_fts_ai AFTER INSERT ON medicos BEGIN
+            INSERT INTO medicos_fts(rowid, nombre, apellido, especialidad)
+            VALUES (new.fila, new.nombre, new.apellido, new.especialidad); END''')
+        cursor.execute('''CREATE TRIGGER IF NOT EXISTS medicos_fts_ad AFTER DELETE ON medicos BEGIN
+            INSERT INTO medicos_fts(medicos_fts, rowid, nombre, apellido, especialidad)
+            VALUES ('delete', old.fila, old.nombre, old.apellido, old.especialidad); END''')
+        cursor.execute('''CREATE TRIGGER IF NOT EXISTS medicos_fts_au AFTER UPDATE ON medicos BEGIN
+            INSERT INTO medicos_fts(medicos_fts, rowid, nombre, apellido, especialidad)
+            VALUES ('delete', old.fila, old.nombre, old.apellido, old.especialidad);
+            INSERT INTO medicos_fts(rowid, nombre, apellido, especialidad)
+            VALUES (new.fila, new.nombre, new.apellido, new.especialidad); END''')
+        if not existia:
+            # Relevancia: nombre y apellido pesan más que la especialidad (queda guardado en el índice)
+            cursor.execute("INSERT INTO medicos_fts(medicos_fts, rank) VALUES ('rank', 'bm25(10.0, 10.0, 1.0)')")
+            # Bases creadas antes del índice: se indexan los médicos ya guardados
+            cursor.execute("INSERT INTO medicos_fts(medicos_fts) VALUES ('rebuild')")
+        return True
 
     def save(self, medico: Medico):
-        with sqlite3.connect(self.db_path) as conn:
+        with self._conectar() as conn:
             cursor = conn.cursor()
-            cursor.execute('INSERT INTO medicos VALUES (?,?,?,?,?)', 
+            cursor.execute('INSERT INTO medicos (id, especialidadId, nombre, apellido, especialidad) VALUES (?,?,?,?,?)',
                 (str(medico.id), str(medico.especialidadId), medico.nombre, medico.apellido, medico.especialidad))
             conn.commit()
         return medico
 
     def save_horario_completo(self, horario: HorarioConfiguracion):
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            # 1. Guardar Config
-            cursor.execute('INSERT INTO horarios VALUES (?,?,?,?,?,?)',
-                (str(horario.id), str(horario.medicoId), horario.dia.value, 
-                 horario.horaInicio.strftime("%H:%M"), horario.horaFin.strftime("%H:%M"), horario.duracionCita))
-            # 2. Guardar Slots
-            for slot in horario.slots:
-                cursor.execute('INSERT INTO slots VALUES (?,?,?,?,?)',
-                    (str(slot.id), str(horario.id), 
-                     slot.horaInicio.strftime("%H:%M"), slot.horaFin.strftime("%H:%M"), slot.estado.value))
-            conn.commit()
+        with self._escritura() as cursor:
+            self._insertar_horarios(cursor, [horario])
+
+    def save_horarios(self, horarios) -> list:
+        """Alta masiva en una sola transacción. Antes de escribir compara los nuevos
+        con los horarios ya guardados de esos médicos; si alguno se cruza no se
+        guarda nada y se devuelven los pares (nuevo, existente) en conflicto."""
+        nuevos = {id(h) for h in horarios}
+        medico_ids = list({str(h.medicoId) for h in horarios})
+        with self._escritura() as cursor:
+            # Dentro de BEGIN IMMEDIATE: nadie puede agregar un horario entre la validación y el INSERT
+            existentes = []
+            for i in range(0, len(medico_ids), 500):
+                lote = medico_ids[i:i + 500]
+                marcas = ",".join("?" * len(lote))
+                cursor.execute(f'''SELECT id, medicoId, dia, horaInicio, horaFin, duracion
+                    FROM horarios WHERE medicoId IN ({marcas})''', lote)
+                existentes.extend(HorarioConfiguracion.reconstruir(r[0], r[1], DiaSemana(r[2]),
+                                                                   _hora(r[3]), _hora(r[4]), r[5])
+                                  for r in cursor.fetchall())
+            conflictos = [(a, b) if id(a) in nuevos else (b, a)
+                          for a, b in HorarioConfiguracion.buscarSolapamientos(existentes + list(horarios))
+                          if (id(a) in nuevos) != (id(b) in nuevos)]
+            if conflictos:
+                return conflictos
+            self._insertar_horarios(cursor, horarios)
+        return []
 
-    def find_by_id(self, medico_id: str) -> Medico:
-        """RECUPERACIÓN COMPLETA: Médico -> Horarios -> Slots"""
-        with sqlite3.connect(self.db_path) as conn:
+    def _insertar_horarios(self, cursor, horarios):
+        """Solo las plantillas (executemany): los slots con fecha se derivan de ellas y
+        la tabla slots queda para los ids antiguos de bases anteriores al calendario"""
+        cursor.executemany('INSERT INTO horarios VALUES (?,?,?,?,?,?)', [
+            (str(h.id), str(h.medicoId), h.dia.value,
+             h.horaInicio.strftime("%H:%M"), h.horaFin.strftime("%H:%M"), h.duracionCita)
+            for h in horarios])
+
+    def find_by_id(self, medico_id: str, dia: DiaSemana = None, con_slots: bool = True) -> Medico:
+        """RECUPERACIÓN COMPLETA: Médico -> Horarios -> Slots.
+        Dos consultas (médico + join horarios/slots por índice) en vez de una por horario.
+        Con `dia` solo se cargan los horarios de ese día de la semana; con
+        con_slots=False, solo las plantillas (el calendario deriva los slots)."""
+        with self._conectar() as conn:
             cursor = conn.cursor()
-            
+
             # A. Médico
             cursor.execute('SELECT * FROM medicos WHERE id = ?', (medico_id,))
             row = cursor.fetchone()
             if not row: return None
-            
-            medico = Medico(row[2], row[3], row[4])
-            medico.id = uuid.UUID(row[0])
-            medico.especialidadId = uuid.UUID(row[1])
-            
-            # B. Horarios
-            cursor.execute('SELECT * FROM horarios WHERE medicoId = ?', (medico_id,))
-            rows_horarios = cursor.fetchall()
-            
-            for rh in rows_horarios:
-                dia_enum = DiaSemana(rh[2])
-                h_inicio = datetime.strptime(rh[3], "%H:%M").time()
-                h_fin = datetime.strptime(rh[4], "%H:%M").time()
-                duracion = rh[5]
-                
-                horario = HorarioConfiguracion(medico.id, dia_enum, h_inicio, h_fin, duracion)
-                horario.id = uuid.UUID(rh[0])
-                
-                # C. Slots
-                cursor.execute('SELECT * FROM slots WHERE horarioId = ?', (str(horario.id),))
-                rows_slots = cursor.fetchall()
-                for rs in rows_slots:
-                    s_inicio = datetime.strptime(rs[2], "%H:%M").time()
-                    s_fin = datetime.strptime(rs[3], "%H:%M").time()
-                    estado_enum = EstadoSlot(rs[4])
-                    
-                    slot = SlotAgenda(horario.id, s_inicio, s_fin)
-                    slot.id = uuid.UUID(rs[0])
-                    slot.estado = estado_enum
-                    horario.slots.append(slot)
-                
-                medico.horarios.append(horario)
-                
+            medico = Medico.reconstruir(row[0], row[1], row[2], row[3], row[4])
+
+            # B y C. Horarios con sus slots en una sola consulta
+            filtro_dia = 'AND h.dia = ?' if dia else ''
+            if con_slots:
+                columnas_slot, union_slots, orden = \
+                    's.id, s.horaInicio, s.horaFin, s.estado', 'LEFT JOIN slots s ON s.horarioId = h.id', 'h.rowid, s.rowid'
+            else:
+                columnas_slot, union_slots, orden = 'NULL, NULL, NULL, NULL', '', 'h.rowid'
+            cursor.execute(f'''
+                SELECT h.id, h.dia, h.horaInicio, h.horaFin, h.duracion, {columnas_slot}
+                FROM horarios h {union_slots}
+                WHERE h.medicoId = ? {filtro_dia}
+                ORDER BY {orden}
+            ''', (medico_id, dia.value) if dia else (medico_id,))
+
+            horarios = {}
+            for r in cursor.fetchall():
+                horario = horarios.get(r[0])
+                if horario is None:
+                    horario = HorarioConfiguracion.reconstruir(
+                        r[0], medico.id, DiaSemana(r[1]), _hora(r[2]), _hora(r[3]), r[4])
+                    horarios[r[0]] = horario
+                    medico.horarios.append(horario)
+                if r[5] is not None:
+                    horario.slots.append(SlotAgenda.reconstruir(
+                        r[5], horario.id, _hora(r[6]), _hora(r[7]), EstadoSlot(r[8])))
+
             return medico
     
-    def reservar_slot(self, slot_id):
-        with sqlite3.connect(self.db_path) as conn:
+    # --- CALENDARIO: OCUPACIÓN POR FECHA ---
+    def ocupacion_del_dia(self, medico_id: str, fecha: date) -> dict:
+        """{horarioId: bitmap de slots reservados ese día}"""
+        with self._conectar() as conn:
             cursor = conn.cursor()
-            # 1. Validar que el slot exista y esté DISPONIBLE
-            cursor.execute('SELECT estado FROM slots WHERE id = ?', (slot_id,))
-            row = cursor.fetchone()
-            
-            if not row or row[0] != 'DISPONIBLE':
-                return False
-            
-            # 2. Actualizar estado a RESERVADO
-            cursor.execute('UPDATE slots SET estado = ? WHERE id = ?', ('RESERVADO', slot_id))
-            conn.commit()
-            return cursor.rowcount > 0
+            cursor.execute('SELECT horarioId, palabra, bits FROM ocupacion WHERE medicoId = ? AND fecha = ?',
+                           (medico_id, fecha.isoformat()))
+            ocupacion = {}
+            for horario_id, palabra, bits in cursor.fetchall():
+                ocupacion[horario_id] = ocupacion.get(horario_id, 0) | (bits << (palabra * BITS_POR_PALABRA))
+            return ocupacion
+
+    def _reservar_fechado(self, cursor, horario_id, fecha: date, indice: int):
+        cursor.execute('SELECT medicoId, dia, horaInicio, horaFin, duracion FROM horarios WHERE id = ?', (horario_id,))
+        row = cursor.fetchone()
+        if not row:
+            return False
+        horario = HorarioConfiguracion.reconstruir(horario_id, row[0], DiaSemana(row[1]),
+                                                   _hora(row[2]), _hora(row[3]), row[4])
+        # El slot debe existir en la plantilla de ese día de la semana
+        if Medico.diaDe(fecha) != horario.dia or not 0 <= indice < horario.cantidadSlots():
+            return False
+
+        palabra, bit = divmod(indice, BITS_POR_PALABRA)
+        mascara = 1 << bit
+        clave = (row[0], fecha.isoformat(), horario_id, palabra)
+        cursor.execute('INSERT OR IGNORE INTO ocupacion (medicoId, fecha, horarioId, palabra) VALUES (?,?,?,?)', clave)
+        # Condicional: el bit solo se enciende si estaba apagado
+        cursor.execute('''UPDATE ocupacion SET bits = bits | ?
+            WHERE medicoId = ? AND fecha = ? AND horarioId = ? AND palabra = ? AND (bits & ?) = 0''',
+            (mascara, *clave, mascara))
+        return cursor.rowcount > 0
+
+    def ocupacion_rango(self, medico_ids, desde: date, hasta: date) -> dict:
+        """{(horarioId, 'AAAA-MM-DD'): bitmap} de varios médicos en un rango de fechas"""
+        ocupacion = {}
+        with self._conectar() as conn:
+            cursor = conn.cursor()
+            for i in range(0, len(medico_ids), 500):
+                lote = medico_ids[i:i + 500]
+                marcas = ",".join("?" * len(lote))
+                # La PK (medicoId, fecha, ...) resuelve cada médico como un rango del índice
+                cursor.execute(f'''SELECT horarioId, fecha, palabra, bits FROM ocupacion
+                    WHERE medicoId IN ({marcas}) AND fecha BETWEEN ? AND ?''',
+                    (*lote, desde.isoformat(), hasta.isoformat()))
+                for horario_id, fecha, palabra, bits in cursor.fetchall():
+                    clave = (horario_id, fecha)
+                    ocupacion[clave] = ocupacion.get(clave, 0) | (bits << (palabra * BITS_POR_PALABRA))
+        return ocupacion
+
+    # --- AGENDA COMPLETA (para el índice de disponibilidad) ---
+    def firma_agenda(self):
+        """Cambia cuando se crean médicos u horarios (nunca se borran)"""
+        with self._conectar() as conn:
+            return conn.execute('SELECT (SELECT COUNT(*) FROM medicos), (SELECT COUNT(*) FROM horarios)').fetchone()
+
+    def cargar_agenda(self):
+        """(médicos, plantillas): [(id, nombre, apellido, especialidad)],
+        [(horarioId, medicoId, día 0-6, minuto de inicio, duración, cantidad de slots)]"""
+        dias = list(DiaSemana)
+        with self._conectar() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, nombre, apellido, especialidad FROM medicos')
+            medicos = cursor.fetchall()
+            cursor.execute('SELECT id, medicoId, dia, horaInicio, horaFin, duracion FROM horarios')
+            plantillas = []
+            for row in cursor.fetchall():
+                # Una plantilla mal guardada no debe tumbar la búsqueda de todos los médicos
+                try:
+                    horario = HorarioConfiguracion.reconstruir(row[0], row[1], DiaSemana(row[2]),
+                                                               _hora(row[3]), _hora(row[4]), row[5])
+                    cantidad = horario.cantidadSlots()
+                except (ValueError, TypeError, AttributeError) as e:
+                    print(f" [!] Horario {row[0]} ignorado: {e}", flush=True)
+                    continue
+                if cantidad == 0:
+                    print(f" [!] Horario {row[0]} ignorado: no genera slots", flush=True)
+                    continue
+                inicio = horario.horaInicio.hour * 60 + horario.horaInicio.minute
+                plantillas.append((row[0], row[1], dias.index(horario.dia), inicio,
+                                   horario.duracionCita, cantidad))
+        return medicos, plantillas
+
+    def _liberar_fechado(self, cursor, horario_id, fecha: date, indice: int):
+        cursor.execute('SELECT medicoId FROM horarios WHERE id = ?', (horario_id,))
+        row = cursor.fetchone()
+        if not row:
+            return
+        palabra, bit = divmod(indice, BITS_POR_PALABRA)
+        clave = (row[0], fecha.isoformat(), horario_id, palabra)
+        cursor.execute('''UPDATE ocupacion SET bits = bits & ?
+            WHERE medicoId = ? AND fecha = ? AND horarioId = ? AND palabra = ?''', (~(1 << bit), *clave))
+        # Una palabra vacía no aporta nada: se borra para mantener la tabla chica
+        cursor.execute('''DELETE FROM ocupacion
+            WHERE medicoId = ? AND fecha = ? AND horarioId = ? AND palabra = ? AND bits = 0''', clave)
+
+    def _liberar(self, cursor, slot_id):
+        fechado = SlotAgenda.desarmarIdFechado(slot_id)
+        if fechado:
+            self._liberar_fechado(cursor, *fechado)
+        else:
+            cursor.execute("UPDATE slots SET estado = 'DISPONIBLE' WHERE id = ?", (slot_id,))
+
+    def _reservar(self, cursor, slot_id):
+        fechado = SlotAgenda.desarmarIdFechado(slot_id)
+        if fechado:
+            return self._reservar_fechado(cursor, *fechado)
+        # Ids antiguos (slot de plantilla con UUID): se mantiene el comportamiento anterior
+        cursor.execute("UPDATE slots SET estado = 'RESERVADO' WHERE id = ? AND estado = 'DISPONIBLE'", (slot_id,))
+        return cursor.rowcount > 0
+
+    def reservar_slot(self, slot_id):
+        with self._escritura() as cursor:
+            return self._reservar(cursor, slot_id)
         
+    def reservar_slots(self, slot_ids):
+        """Reserva varios slots en una sola transacción; devuelve los que sí se reservaron"""
+        reservados = []
+        with self._escritura() as cursor:
+            for slot_id in slot_ids:
+                if self._reservar(cursor, slot_id):
+                    reservados.append(slot_id)
+        return reservados
+
+    # --- RETENCIONES (reserva en dos fases: retener -> confirmar / liberar) ---
+    def retener_slot(self, slot_id, ttl: float):
+        """Ocupa el slot por `ttl` segundos. Devuelve (token, expira) o None si no está libre"""
+        with self._escritura() as cursor:
+            # Una retención vencida de este slot se suelta aquí mismo, sin esperar al barrido
+            self._soltar_vencidas(cursor, slot_id=slot_id)
+            if not self._reservar(cursor, slot_id):
+                return None
+            token = secrets.token_hex(16)
+            expira = reloj.time() + ttl
+            cursor.execute('INSERT INTO retenciones (slotId, token, expira) VALUES (?,?,?)', (slot_id, token, expira))
+            return token, expira
+
+    def confirmar_slot(self, slot_id, token):
+        """La retención vigente pasa a reserva definitiva (el slot ya está ocupado)"""
+        with self._escritura() as cursor:
+            cursor.execute('DELETE FROM retenciones WHERE slotId = ? AND token = ? AND expira > ?',
+                           (slot_id, token, reloj.time()))
+            return cursor.rowcount > 0
+
+    def liberar_slot(self, slot_id, token):
+        with self._escritura() as cursor:
+            cursor.execute('DELETE FROM retenciones WHERE slotId = ? AND token = ?', (slot_id, token))
+            if cursor.rowcount == 0:
+                return False
+            self._liberar(cursor, slot_id)
+            return True
+
+    # --- RETENCIONES POR LOTE (un solo token para todos los slots del lote) ---
+    def _medico_del_slot(self, cursor, slot_id):
+        """Dueño del slot según su horario, o None si el slot no existe"""
+        fechado = SlotAgenda.desarmarIdFechado(slot_id)
+        if fechado:
+            cursor.execute('SELECT medicoId FROM horarios WHERE id = ?', (fechado[0],))
+        else:
+            cursor.execute('SELECT h.medicoId FROM slots s JOIN horarios h ON h.id = s.horarioId WHERE s.id = ?',
+                           (slot_id,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def retener_slots(self, slot_ids, ttl: float, medico_ids=None):
+        """Retiene varios slots en una transacción. Con `medico_ids` (alineado con slot_ids)
+        cada slot debe pertenecer a ese médico. Devuelve (token, expira, retenidos, ajenos)"""
+        token = secrets.token_hex(16)
+        expira = reloj.time() + ttl
+        retenidos, ajenos = [], []
+        with self._escritura() as cursor:
+            for i, slot_id in enumerate(slot_ids):
+                if medico_ids is not None and self._medico_del_slot(cursor, slot_id) != medico_ids[i]:
+                    ajenos.append(slot_id)
+                    continue
+                self._soltar_vencidas(cursor, slot_id=slot_id)
+                if self._reservar(cursor, slot_id):
+                    cursor.execute('INSERT INTO retenciones (slotId, token, expira) VALUES (?,?,?)',
+                                   (slot_id, token, expira))
+                    retenidos.append(slot_id)
+        return token, expira, retenidos, ajenos
+
+    def confirmar_slots(self, token, slot_ids):
+        """Los slots del lote cuya retención seguía vigente pasan a reserva definitiva"""
+        confirmados = []
+        with self._escritura() as cursor:
+            ahora = reloj.time()
+            for slot_id in slot_ids:
+                cursor.execute('DELETE FROM retenciones WHERE slotId = ? AND token = ? AND expira > ?',
+                               (slot_id, token, ahora))
+                if cursor.rowcount > 0:
+                    confirmados.append(slot_id)
+        return confirmados
+
+    def liberar_slots(self, token, slot_ids):
+        """Devuelve al calendario los slots del lote que aún estaban retenidos"""
+        liberados = []
+        with self._escritura() as cursor:
+            for slot_id in slot_ids:
+                cursor.execute('DELETE FROM retenciones WHERE slotId = ? AND token = ?', (slot_id, token))
+                if cursor.rowcount > 0:
+                    self._liberar(cursor, slot_id)
+                    liberados.append(slot_id)
+        return liberados
+
+    def barrer_retenciones(self, limite=500):
+        """Suelta las retenciones vencidas (consulta por el índice de expiración)"""
+        with self._escritura() as cursor:
+            return self._soltar_vencidas(cursor, limite=limite)
+
+    def _soltar_vencidas(self, cursor, slot_id=None, limite=500):
+        if slot_id:
+            cursor.execute('SELECT slotId FROM retenciones WHERE slotId = ? AND expira <= ?', (slot_id, reloj.time()))
+        else:
+            cursor.execute('SELECT slotId FROM retenciones WHERE expira <= ? LIMIT ?', (reloj.time(), limite))
+        vencidas = [row[0] for row in cursor.fetchall()]
+        for vencida in vencidas:
+            self._liberar(cursor, vencida)
+        cursor.executemany('DELETE FROM retenciones WHERE slotId = ?', [(v,) for v in vencidas])
+        return len(vencidas)
+
     # --- LISTAR TODOS ---
     def find_all(self):
-        with sqlite3.connect(self.db_path) as conn:
+        with self._conectar() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT * FROM medicos')
             rows = cursor.fetchall()
             return self._map_rows_to_medicos(cursor, rows) # Usamos helper para no repetir código
 
-    # --- BUSCAR POR NOMBRE O APELLIDO ---
-    def search(self, query):
-        with sqlite3.connect(self.db_path) as conn:
+    # --- BUSCAR VARIOS POR ID (sin horarios) ---
+    def find_by_ids(self, ids):
+        """Búsqueda por clave primaria; en lotes para no superar el límite de parámetros de SQLite"""
+        medicos = []
+        with self._conectar() as conn:
+            cursor = conn.cursor()
+            for i in range(0, len(ids), 500):
+                lote = ids[i:i + 500]
+                marcas = ",".join("?" * len(lote))
+                cursor.execute(f'SELECT * FROM medicos WHERE id IN ({marcas})', lote)
+                medicos.extend(self._map_rows_to_medicos(cursor, cursor.fetchall()))
+        return medicos
+
+    # --- BUSCAR POR NOMBRE, APELLIDO O ESPECIALIDAD ---
+    def search(self, query, limite: int = 50, desplazamiento: int = 0):
+        """Cada palabra de `query` como prefijo ('card hou' -> card* AND hou*),
+        ordenado por relevancia (bm25, ver _init_busqueda)"""
+        palabras = _PALABRA.findall(query or '')
+        if not palabras:
+            return []
+        with self._conectar() as conn:
             cursor = conn.cursor()
-            param = f"%{query}%"
-            cursor.execute('''
-                SELECT * FROM medicos 
-                WHERE nombre LIKE ? OR apellido LIKE ? OR especialidad LIKE ?
-            ''', (param, param, param))
+            if self._fts:
+                consulta = ' '.join(f'"{p}"*' for p in palabras)
+                # Se ordena y pagina dentro del índice; solo la página se cruza con la tabla
+                cursor.execute('''
+                    SELECT m.* FROM (
+                        SELECT rowid, rank FROM medicos_fts WHERE medicos_fts MATCH ?
+                        ORDER BY rank, rowid LIMIT ? OFFSET ?) f
+                    JOIN medicos m ON m.fila = f.rowid
+                    ORDER BY f.rank, f.rowid''', (consulta, limite, desplazamiento))
+            else:
+                param = f"%{query}%"
+                cursor.execute('''
+                    SELECT * FROM medicos
+                    WHERE nombre LIKE ? OR apellido LIKE ? OR especialidad LIKE ?
+                    ORDER BY rowid LIMIT ? OFFSET ?
+                ''', (param, param, param, limite, desplazamiento))
             rows = cursor.fetchall()
             return self._map_rows_to_medicos(cursor, rows)
 
@@ -126,8 +504,5 @@ class SQLiteMedicoRepository:
         medicos = []
         for row in rows:
             # row: 0:id, 1:espId, 2:nombre, 3:apellido, 4:especialidad
-            m = Medico(row[2], row[3], row[4])
-            m.id = uuid.UUID(row[0])
-            m.especialidadId = uuid.UUID(row[1])
-            medicos.append(m)
+            medicos.append(Medico.reconstruir(row[0], row[1], row[2], row[3], row[4]))
         return medicos
\ No newline at end of file
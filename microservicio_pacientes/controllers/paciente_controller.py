@@ -1,9 +1,13 @@
-from flask import Blueprint, request, jsonify
+import io
+import json
+from flask import Blueprint, Response, request, jsonify
 from domain.models import Paciente, Direccion, DatosContacto, TipoIdentificacion, Genero
-from repositories.paciente_repository import SQLitePacienteRepository
+from repositories.paciente_repository import SQLitePacienteRepository, IdentificacionDuplicada
+from repositories.importador_pacientes import ImportadorPacientes, leer_csv, leer_ndjson
 
 controller = Blueprint('paciente_controller', __name__)
 repo = SQLitePacienteRepository()
+importador = ImportadorPacientes(repo)
 
 # 1. REGISTRAR PACIENTE
 @controller.route('/registrar', methods=['POST'])
@@ -25,15 +29,45 @@ def registrar():
         p = Paciente(d['identificacion'], tipo_enum, d['nombre'], 
                      genero_enum, d['fechaNacimiento'], contacto, direccion)
         
+        # Identificación duplicada: se consulta la base, no el filtro en memoria, que
+        # puede no conocer aún lo registrado por otra réplica
+        if repo.exists_by_identificacion(p.identificacion, exacto=True):
+            return jsonify({"error": "Ya existe un paciente con esa identificación"}), 409
+
         # Ejecutar lógica de dominio
         p.registrar()
         
         # Persistir
         repo.save(p)
         return jsonify({"id": str(p.id), "mensaje": "Paciente registrado"}), 201
+    except IdentificacionDuplicada:
+        # Otro proceso la registró entre la consulta y el INSERT
+        return jsonify({"error": "Ya existe un paciente con esa identificación"}), 409
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# 1.1 IMPORTACIÓN MASIVA (cuerpo CSV con encabezado o NDJSON, leído en streaming)
+@controller.route('/importar', methods=['POST'])
+def importar():
+    """?formato=csv|ndjson (o por Content-Type). Importa las filas válidas y
+    devuelve el reporte con el número de fila y los errores de las rechazadas."""
+    formato = request.args.get('formato')
+    if not formato:
+        formato = 'ndjson' if 'ndjson' in (request.content_type or '') else 'csv'
+    if formato not in ('csv', 'ndjson'):
+        return jsonify({"error": "formato debe ser 'csv' o 'ndjson'"}), 400
+
+    # El cuerpo se decodifica a medida que se lee: no se carga el archivo completo
+    texto = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='')
+    try:
+        filas = leer_csv(texto) if formato == 'csv' else leer_ndjson(texto)
+        reporte = importador.importar(filas)
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    return jsonify(reporte), 200
+
 # 2. ACTUALIZAR DOMICILIO (Modificado para DDD)
 @controller.route('/<id>/domicilio', methods=['PUT'])
 def actualizar_domicilio(id):
@@ -78,14 +112,60 @@ def paciente_to_dict(p: Paciente):
         "estado": p.estado.value
     }
 
-# 3. LISTAR TODOS 
+CAMPOS_PACIENTE = ("id", "identificacion", "tipoId", "nombre", "genero", "fechaNacimiento",
+                   "email", "telefono", "direccion", "estado")
+
+# 3. LISTAR TODOS
+#   /listar                  -> arreglo JSON completo, enviado en streaming
+#   /listar?formato=ndjson   -> un paciente por línea, en streaming
+#   /listar?limite=&cursor=  -> una página {"items", "siguienteCursor"}
+LIMITE_PAGINA = 100
+MAX_LIMITE_PAGINA = 1000
+BYTES_POR_ENVIO = 64 * 1024
+
+def _exportar(formato):
+    """Serializa al vuelo y envía en bloques de ~64 KB: memoria constante y el
+    primer byte sale antes de terminar de recorrer la tabla"""
+    ndjson = formato == 'ndjson'
+    bloque, tamanio = [] if ndjson else ['['], 0 if ndjson else 1
+    primero = True
+    try:
+        for p in repo.iterar_todos():
+            texto = json.dumps(paciente_to_dict(p), ensure_ascii=False)
+            if ndjson:
+                texto += '\n'
+            elif not primero:
+                texto = ',' + texto
+            primero = False
+            bloque.append(texto)
+            tamanio += len(texto)
+            if tamanio >= BYTES_POR_ENVIO:
+                yield ''.join(bloque)
+                bloque, tamanio = [], 0
+    except Exception as e:
+        # Los encabezados ya salieron: solo queda cortar la respuesta (queda JSON inválido)
+        print(f" [!] Error exportando pacientes: {e}", flush=True)
+        raise
+    if not ndjson:
+        bloque.append(']')
+    yield ''.join(bloque)
+
 @controller.route('/listar', methods=['GET'])
 def listar_pacientes():
     try:
-        pacientes = repo.find_all()
-        # Convertimos la lista de objetos a lista de diccionarios
-        response = [paciente_to_dict(p) for p in pacientes]
-        return jsonify(response), 200
+        if 'limite' in request.args or 'cursor' in request.args:
+            try:
+                limite = min(max(int(request.args.get('limite', LIMITE_PAGINA)), 1), MAX_LIMITE_PAGINA)
+                pacientes, siguiente = repo.find_page(limite, request.args.get('cursor'))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            return jsonify({"items": [paciente_to_dict(p) for p in pacientes], "siguienteCursor": siguiente}), 200
+
+        formato = request.args.get('formato', 'json')
+        if formato not in ('json', 'ndjson'):
+            return jsonify({"error": "formato debe ser 'json' o 'ndjson'"}), 400
+        tipo = 'application/x-ndjson' if formato == 'ndjson' else 'application/json'
+        return Response(_exportar(formato), mimetype=tipo), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -100,22 +180,115 @@ def listar_paciente_id(id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-# 5. BUSCAR POR CRITERIO (nombre o identificación)    
+# 4.0 VARIOS PACIENTES EN UNA CONSULTA (ids y/o identificaciones)
+#   GET  /batch?ids=a,b,c&campos=nombre,email
+#   POST /batch {"ids": [...], "campos": [...]}
+MAX_IDS_BATCH = 5000
+
+@controller.route('/batch', methods=['GET', 'POST'])
+def obtener_varios():
+    if request.method == 'POST':
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            data = {}  # cae en el 400 de abajo
+        claves, campos = data.get('ids'), data.get('campos')
+        if not isinstance(claves, list) or (campos is not None and not isinstance(campos, list)):
+            return jsonify({"error": "Se espera {'ids': [...], 'campos': [...] opcional}"}), 400
+    else:
+        claves = [c for c in request.args.get('ids', '').split(',') if c.strip()]
+        campos = request.args.get('campos')
+        campos = [c for c in campos.split(',') if c.strip()] if campos else None
+
+    claves = list(dict.fromkeys(str(c).strip() for c in claves))
+    if not claves:
+        return jsonify({"error": "Indique al menos un id o identificación en 'ids'"}), 400
+    if len(claves) > MAX_IDS_BATCH:
+        return jsonify({"error": f"Máximo {MAX_IDS_BATCH} ids por consulta"}), 400
+    if campos is not None:
+        campos = [str(c).strip() for c in campos]
+        desconocidos = [c for c in campos if c not in CAMPOS_PACIENTE]
+        if desconocidos:
+            return jsonify({"error": f"Campos desconocidos: {', '.join(desconocidos)}",
+                            "disponibles": list(CAMPOS_PACIENTE)}), 400
+
+    try:
+        encontrados = repo.find_by_claves(claves)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    pacientes = {}
+    for clave, p in encontrados.items():
+        completo = paciente_to_dict(p)
+        pacientes[clave] = {c: completo[c] for c in campos} if campos else completo
+    return jsonify({
+        "pacientes": pacientes,
+        "noEncontrados": [c for c in claves if c not in encontrados]
+    }), 200
+
+# 4.1 BUSCAR POR IDENTIFICACIÓN EXACTA (índice único)
+@controller.route('/identificacion/<identificacion>', methods=['GET'])
+def obtener_por_identificacion(identificacion):
+    try:
+        paciente = repo.find_by_identificacion(identificacion)
+        if not paciente:
+            return jsonify({"error": "Paciente no encontrado"}), 404
+        return jsonify(paciente_to_dict(paciente)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# 5. BUSCAR POR CRITERIO (id/identificación exacta, prefijo de identificación o nombre)
+LIMITE_BUSQUEDA = 50
+MAX_LIMITE_BUSQUEDA = 200
+
 @controller.route('/buscar', methods=['GET'])
 def buscar_pacientes():
     try:
         query = request.args.get('q') # Recibe ?q=Juan
         if not query:
             return jsonify({"error": "Escriba un criterio de búsqueda"}), 400
-            
-        resultados = repo.search(query)
-        response = [paciente_to_dict(p) for p in resultados]
-        return jsonify(response), 200
+        try:
+            limite = min(max(int(request.args.get('limite', LIMITE_BUSQUEDA)), 1), MAX_LIMITE_BUSQUEDA)
+            resultados, siguiente = repo.search(query, limite, request.args.get('cursor'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        response = jsonify([paciente_to_dict(p) for p in resultados])
+        # La respuesta sigue siendo una lista; la página siguiente va en la cabecera
+        if siguiente:
+            response.headers['X-Siguiente-Cursor'] = siguiente
+        return response, 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-# 5. VALIDAR EXISTENCIA
+# 5. VALIDAR EXISTENCIA (filtro de Bloom en memoria: un "no existe" no consulta SQLite)
+# El filtro es de cada proceso y se sincroniza cada PACIENTES_INTERVALO_SINCRONIZACION
+# segundos: un paciente recién guardado por otra réplica o por el importador de línea
+# de comandos puede figurar como inexistente durante ese intervalo. /registrar no
+# depende de esta respuesta: consulta la base.
 @controller.route('/validar/<identificacion>', methods=['GET'])
 def validar(identificacion):
     existe = repo.exists_by_identificacion(identificacion)
-    return jsonify({"existe": existe}), 200
\ No newline at end of file
+    return jsonify({"existe": existe}), 200
+
+# 5.1 VALIDAR VARIAS IDENTIFICACIONES
+#   POST /validar {"identificaciones": [...]} -> {"existen": {identificacion: bool}}
+MAX_VALIDAR_LOTE = 10000
+
+@controller.route('/validar', methods=['POST'])
+def validar_varias():
+    data = request.get_json(silent=True)
+    identificaciones = data.get('identificaciones') if isinstance(data, dict) else None
+    if not isinstance(identificaciones, list) or not identificaciones:
+        return jsonify({"error": "Se espera {'identificaciones': [...]}"}), 400
+    identificaciones = list(dict.fromkeys(str(i) for i in identificaciones))
+    if len(identificaciones) > MAX_VALIDAR_LOTE:
+        return jsonify({"error": f"Máximo {MAX_VALIDAR_LOTE} identificaciones por consulta"}), 400
+    try:
+        existentes = repo.identificaciones_existentes(identificaciones)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"existen": {i: i in existentes for i in identificaciones}}), 200
+
+# 5.2 ESTADO DEL FILTRO (tamaño, memoria, tasa de falsos positivos teórica y observada)
+@controller.route('/metricas/filtro', methods=['GET'])
+def estado_filtro():
+    return jsonify(repo.estadisticas_filtro()), 200
\ No newline at end of file
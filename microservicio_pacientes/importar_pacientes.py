@@ -0,0 +1,44 @@
+# Importación masiva de pacientes desde la línea de comandos
+# Uso: python importar_pacientes.py pacientes.csv [--formato csv|ndjson] [--db pacientes.db] [--reporte errores.json]
+# Mismo proceso que POST /importar, pero leyendo el archivo directamente
+import argparse
+import json
+import sys
+import time
+from repositories.paciente_repository import SQLitePacienteRepository
+from repositories.importador_pacientes import ImportadorPacientes, leer_csv, leer_ndjson, FILAS_POR_LOTE
+
+def main():
+    parser = argparse.ArgumentParser(description="Importación masiva de pacientes (CSV con encabezado o NDJSON)")
+    parser.add_argument("archivo", help="Archivo a importar ('-' para la entrada estándar)")
+    parser.add_argument("--formato", choices=["csv", "ndjson"], help="Por defecto, según la extensión")
+    parser.add_argument("--db", default="pacientes.db", help="Base de datos de pacientes")
+    parser.add_argument("--lote", type=int, default=FILAS_POR_LOTE, help="Filas por transacción")
+    parser.add_argument("--reporte", help="Guarda el reporte completo (JSON) en este archivo")
+    args = parser.parse_args()
+
+    formato = args.formato or ('ndjson' if args.archivo.endswith(('.ndjson', '.jsonl')) else 'csv')
+    importador = ImportadorPacientes(SQLitePacienteRepository(args.db), args.lote)
+
+    entrada = sys.stdin if args.archivo == '-' else open(args.archivo, encoding='utf-8-sig', newline='')
+    inicio = time.perf_counter()
+    try:
+        reporte = importador.importar(leer_csv(entrada) if formato == 'csv' else leer_ndjson(entrada))
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+    finally:
+        entrada.close()
+    duracion = time.perf_counter() - inicio
+
+    print(f"Procesadas: {reporte['procesadas']} | importadas: {reporte['importadas']} | "
+          f"rechazadas: {reporte['rechazadas']} | {reporte['procesadas'] / max(duracion, 1e-9):.0f} filas/s")
+    for error in reporte["errores"][:20]:
+        print(f"  fila {error['fila']}: {'; '.join(error['errores'])}")
+    if reporte["rechazadas"] > 20:
+        print(f"  ... ({reporte['rechazadas'] - 20} más)")
+    if args.reporte:
+        with open(args.reporte, 'w', encoding='utf-8') as f:
+            json.dump(reporte, f, ensure_ascii=False, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,20 @@
 # Archivo: microservicio_pacientes/main.py
-from flask import Flask
+from flask import Flask, jsonify
 from flask_cors import CORS 
-from controllers.paciente_controller import controller
+from controllers.paciente_controller import controller, repo
+from repositories.sincronizacion_filtro import iniciar_sincronizacion
 
 app = Flask(__name__)
 CORS(app) 
 
 app.register_blueprint(controller)
 
+# Chequeo de salud usado por el balanceador del gateway
+@app.route('/health', methods=['GET'])
+def health():
+    return jsonify({"estado": "OK"}), 200
+
 if __name__ == '__main__':
+    iniciar_sincronizacion(repo)  # el filtro de identificaciones ve lo que guardan otros procesos
     # Puerto 5003 según docker-compose
     app.run(host='0.0.0.0', port=5003)
\ No newline at end of file
@@ -0,0 +1,68 @@
+from hashlib import blake2b
+import math
+
+class FiltroBloom:
+    """Conjunto aproximado: `clave in filtro` es False solo si la clave nunca se
+    agregó (sin falsos negativos); True puede ser un falso positivo con
+    probabilidad ~tasa_objetivo mientras no se superen `capacidad` elementos.
+
+    k posiciones por clave con doble hashing (h1 + i*h2) sobre un solo blake2b."""
+
+    def __init__(self, capacidad: int, tasa_objetivo: float = 0.01):
+        self.capacidad = max(int(capacidad), 1)
+        self.tasa_objetivo = tasa_objetivo
+        # Tamaño óptimo: m = -n ln(p) / ln(2)^2 bits, k = m/n ln(2) hashes
+        self.bits = max(int(-self.capacidad * math.log(tasa_objetivo) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.bits / self.capacidad * math.log(2)), 1)
+        self._arreglo = bytearray((self.bits + 7) // 8)
+        self.elementos = 0
+
+    def _hashes(self, clave: str):
+        # str(): SQLite guarda 123 y "123" igual en una columna TEXT
+        digest = blake2b(str(clave).encode(), digest_size=16).digest()
+        return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+    def agregar(self, clave: str):
+        h, paso = self._hashes(clave)
+        bits, arreglo = self.bits, self._arreglo
+        nuevo = False
+        for _ in range(self.hashes):
+            p = h % bits
+            mascara = 1 << (p & 7)
+            if not arreglo[p >> 3] & mascara:
+                arreglo[p >> 3] |= mascara
+                nuevo = True
+            h += paso
+        # Volver a agregar una clave no la cuenta dos veces
+        if nuevo:
+            self.elementos += 1
+
+    def __contains__(self, clave: str) -> bool:
+        h, paso = self._hashes(clave)
+        bits, arreglo = self.bits, self._arreglo
+        for _ in range(self.hashes):
+            p = h % bits
+            # Un bit apagado basta para descartar: los negativos casi nunca recorren los k
+            if not arreglo[p >> 3] & (1 << (p & 7)):
+                return False
+            h += paso
+        return True
+
+    @property
+    def lleno(self) -> bool:
+        return self.elementos > self.capacidad
+
+    def tasa_estimada(self) -> float:
+        """Probabilidad teórica de falso positivo con los elementos actuales: (1 - e^(-kn/m))^k"""
+        return (1 - math.exp(-self.hashes * self.elementos / self.bits)) ** self.hashes
+
+    def estadisticas(self):
+        return {
+            "elementos": self.elementos,
+            "capacidad": self.capacidad,
+            "bits": self.bits,
+            "hashes": self.hashes,
+            "memoriaBytes": len(self._arreglo),
+            "tasaObjetivo": self.tasa_objetivo,
+            "tasaEstimada": round(self.tasa_estimada(), 6)
+        }
@@ -0,0 +1,171 @@
+import csv
+import json
+import os
+import re
+from domain.models import TipoIdentificacion, Genero, EstadoPaciente
+
+# Mismos campos que recibe /registrar (encabezado del CSV o claves de cada línea NDJSON)
+CAMPOS = ('identificacion', 'tipoIdentificacion', 'nombre', 'genero', 'fechaNacimiento',
+          'email', 'telefono', 'calle', 'numero', 'ciudad')
+OBLIGATORIOS = ('identificacion', 'tipoIdentificacion', 'nombre', 'genero')
+FILAS_POR_LOTE = 20000
+MAX_ERRORES_REPORTADOS = 1000
+
+_FECHA = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_TIPOS = {t.value for t in TipoIdentificacion}
+_GENEROS = {g.value for g in Genero}
+
+class ErrorFila(ValueError):
+    """Fila que no se pudo leer (JSON roto, columnas de más o de menos)"""
+
+def _uuids_v4(cantidad):
+    """`cantidad` UUID v4 en texto a partir de una sola lectura de os.urandom
+    (uuid.uuid4() hace una llamada al sistema por id y domina el costo por fila)"""
+    h = os.urandom(16 * cantidad).hex()
+    ids = []
+    for i in range(0, 32 * cantidad, 32):
+        s = h[i:i + 32]
+        ids.append(f"{s[:8]}-{s[8:12]}-4{s[13:16]}-{'89ab'[int(s[16], 16) & 3]}{s[17:20]}-{s[20:]}")
+    return ids
+
+def _sin_cortes(iterador):
+    """Recorre `iterador` sin que un error de lectura corte la importación.
+    Un csv.Error afecta a una sola fila y el lector sigue en la siguiente. Con
+    bytes que no son UTF-8 el decodificador descarta el bloque entero, así que
+    la lectura termina ahí; el reporte conserva lo ya importado."""
+    while True:
+        try:
+            yield next(iterador)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            yield ErrorFila(f"CSV inválido: {e}")
+        except UnicodeDecodeError as e:
+            yield ErrorFila(f"El archivo no es UTF-8 válido ({e.reason}); se detuvo la lectura y no se importó el resto del archivo")
+            return
+
+# --- LECTORES: cada fila sale como tupla en el orden de CAMPOS ---
+def leer_csv(texto):
+    """CSV con encabezado (columnas en cualquier orden, las desconocidas se ignoran).
+    csv.reader + posiciones fijas: DictReader arma un dict por fila y cuesta el doble."""
+    lector = csv.reader(texto)
+    try:
+        encabezado = [c.strip() for c in next(lector, [])]
+    except (csv.Error, UnicodeDecodeError) as e:
+        raise ValueError(f"No se pudo leer el encabezado: {e}")
+    faltan = [c for c in OBLIGATORIOS if c not in encabezado]
+    if faltan:
+        raise ValueError(f"Faltan columnas en el encabezado: {', '.join(faltan)}")
+    posiciones = [encabezado.index(c) if c in encabezado else None for c in CAMPOS]
+    ancho = len(encabezado)
+    for fila in _sin_cortes(lector):
+        if isinstance(fila, ErrorFila):
+            yield fila
+        elif not fila:
+            continue
+        elif len(fila) != ancho:
+            yield ErrorFila(f"Se esperaban {ancho} columnas y llegaron {len(fila)}")
+        else:
+            yield tuple(fila[i] if i is not None else '' for i in posiciones)
+
+def leer_ndjson(texto):
+    """Un objeto JSON por línea"""
+    for linea in _sin_cortes(iter(texto)):
+        if isinstance(linea, ErrorFila):
+            yield linea
+            continue
+        if not linea.strip():
+            continue
+        try:
+            objeto = json.loads(linea)
+        except ValueError as e:
+            yield ErrorFila(f"JSON inválido: {e}")
+            continue
+        if not isinstance(objeto, dict):
+            yield ErrorFila("La línea no es un objeto JSON")
+        else:
+            yield tuple('' if objeto.get(c) is None else str(objeto[c]) for c in CAMPOS)
+
+class ImportadorPacientes:
+    """Ingesta masiva: valida cada fila, agrupa en lotes y guarda cada lote con
+    executemany en una transacción. Las filas inválidas o duplicadas no detienen
+    la importación; se devuelven en el reporte con su número de fila."""
+
+    def __init__(self, repo, filas_por_lote: int = FILAS_POR_LOTE):
+        self.repo = repo
+        self.filas_por_lote = filas_por_lote
+
+    def importar(self, filas) -> dict:
+        reporte = {"procesadas": 0, "importadas": 0, "rechazadas": 0, "errores": [], "erroresOmitidos": 0}
+        vistas = set()   # identificaciones ya aceptadas en este archivo
+        lote = []        # (número de fila, tupla en el orden de CAMPOS)
+        numero = 0
+        for numero, fila in enumerate(filas, start=1):
+            errores = self._validar(fila)
+            if errores:
+                self._rechazar(reporte, numero, fila, errores)
+            elif fila[0] in vistas:
+                self._rechazar(reporte, numero, fila, ["identificacion repetida en el archivo"])
+            else:
+                vistas.add(fila[0])
+                lote.append((numero, fila))
+                if len(lote) >= self.filas_por_lote:
+                    self._guardar(lote, reporte)
+                    lote = []
+        if lote:
+            self._guardar(lote, reporte)
+        reporte["procesadas"] = numero
+        # Los duplicados contra la base se detectan al guardar cada lote: se reordena por fila
+        reporte["errores"].sort(key=lambda e: (e["fila"] is None, e["fila"] or 0))
+        return reporte
+
+    # --- VALIDACIÓN ---
+    def _validar(self, fila):
+        if isinstance(fila, Exception):
+            return [str(fila)]
+        identificacion, tipo, nombre, genero, fecha = fila[:5]
+        # Camino rápido: la gran mayoría de filas son válidas
+        if (identificacion and nombre and tipo in _TIPOS and genero in _GENEROS
+                and (not fecha or _FECHA.match(fecha)) and identificacion == identificacion.strip()):
+            return None
+        errores = [f"Falta '{c}'" for c, v in zip(CAMPOS, fila) if c in OBLIGATORIOS and not v.strip()]
+        if identificacion != identificacion.strip():
+            errores.append("identificacion con espacios al inicio o al final")
+        if tipo and tipo not in _TIPOS:
+            errores.append(f"tipoIdentificacion debe ser uno de {sorted(_TIPOS)}")
+        if genero and genero not in _GENEROS:
+            errores.append(f"genero debe ser uno de {sorted(_GENEROS)}")
+        if fecha and not _FECHA.match(fecha):
+            errores.append("fechaNacimiento debe tener formato AAAA-MM-DD")
+        return errores
+
+    def _rechazar(self, reporte, numero, fila, errores):
+        reporte["rechazadas"] += 1
+        if len(reporte["errores"]) < MAX_ERRORES_REPORTADOS:
+            identificacion = fila[0] if isinstance(fila, tuple) else None
+            reporte["errores"].append({"fila": numero, "identificacion": identificacion, "errores": errores})
+        else:
+            reporte["erroresOmitidos"] += 1
+
+    # --- PERSISTENCIA ---
+    def _guardar(self, lote, reporte):
+        """Descarta las identificaciones que ya existen (una consulta por lote) y guarda el resto"""
+        existentes = self.repo.identificaciones_existentes([fila[0] for _, fila in lote])
+        activo = EstadoPaciente.Activo.value  # estado inicial de Paciente.registrar()
+        nuevas = []
+        for (numero, fila), id_paciente in zip(lote, _uuids_v4(len(lote))):
+            if fila[0] in existentes:
+                self._rechazar(reporte, numero, fila, ["identificacion ya registrada"])
+            else:
+                # Mismo orden de columnas que SQLitePacienteRepository.save
+                nuevas.append((id_paciente,) + fila + (activo,))
+        if not nuevas:
+            return
+        guardadas = self.repo.save_lote(nuevas)
+        reporte["importadas"] += guardadas
+        if guardadas < len(nuevas):
+            # Otro proceso registró alguna de estas identificaciones entre la consulta y el INSERT
+            perdidas = len(nuevas) - guardadas
+            reporte["rechazadas"] += perdidas
+            reporte["errores"].append({"fila": None, "identificacion": None, "errores": [
+                f"{perdidas} filas del lote ya habían sido registradas por otra operación"]})
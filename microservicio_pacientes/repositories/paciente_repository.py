@@ -1,10 +1,115 @@
+import base64
+import json
+import os
+import re
 import sqlite3
+import threading
 from domain.models import Paciente, Direccion, DatosContacto, EstadoPaciente, TipoIdentificacion, Genero
+from repositories.filtro_bloom import FiltroBloom
+
+# Palabras del nombre que se buscan como prefijos en el índice de texto completo
+_PALABRA = re.compile(r"\w+", re.UNICODE)
+_UUID = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+
+# Por encima de esta cantidad de coincidencias el orden por relevancia costaría
+# puntuar cada una; la búsqueda es demasiado amplia y se devuelve en orden de registro
+MAX_RANQUEO = 5000
+
+# Filtro de Bloom sobre identificacion: tasa de falsos positivos buscada y tamaño mínimo.
+# Se dimensiona al doble de los pacientes actuales y se reconstruye al llenarse.
+BLOOM_TASA = float(os.getenv("PACIENTES_BLOOM_TASA", "0.01"))
+BLOOM_CAPACIDAD_MINIMA = 100000
+
+def _codificar_cursor(valores) -> str:
+    return base64.urlsafe_b64encode(json.dumps(valores).encode()).decode()
+
+# Claves que puede traer un cursor: rowid, rank de bm25, identificación
+_TIPOS_CURSOR = {"i": int, "r": (int, float), "id": str}
+
+def _decodificar_cursor(cursor: str, *requeridas):
+    """Objeto del cursor con las claves `requeridas`; cualquier otra forma es ValueError"""
+    try:
+        marca = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Cursor inválido")
+    if (not isinstance(marca, dict) or any(c not in marca for c in requeridas)
+            or any(c not in _TIPOS_CURSOR or isinstance(v, bool) or not isinstance(v, _TIPOS_CURSOR[c])
+                   for c, v in marca.items())):
+        raise ValueError("Cursor inválido")
+    return marca
+
+class IdentificacionDuplicada(Exception):
+    """La identificación ya está registrada (índice UNIQUE)"""
 
 class SQLitePacienteRepository:
     def __init__(self, db_path="pacientes.db"):
         self.db_path = db_path
         self._init_db()
+        self._lock_filtro = threading.Lock()
+        self._ultimo_rowid = 0
+        self.consultas_filtro = {"descartadas": 0, "existentes": 0, "falsosPositivos": 0, "reconstrucciones": 0}
+        self._reconstruir_filtro()
+
+    # --- FILTRO DE BLOOM (existencia de identificaciones sin tocar SQLite) ---
+    def _reconstruir_filtro(self):
+        """Filtro nuevo con todas las identificaciones guardadas hasta el último rowid"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) FROM pacientes')
+            filtro = FiltroBloom(max(2 * cursor.fetchone()[0], BLOOM_CAPACIDAD_MINIMA), BLOOM_TASA)
+            cursor.execute('SELECT MAX(rowid) FROM pacientes')
+            ultimo = cursor.fetchone()[0] or 0
+            # Filas antiguas pueden no tener identificación: no hay nada que anotar
+            cursor.execute('SELECT identificacion FROM pacientes WHERE rowid <= ? AND identificacion IS NOT NULL',
+                           (ultimo,))
+            while True:
+                rows = cursor.fetchmany(5000)
+                if not rows:
+                    break
+                for (identificacion,) in rows:
+                    filtro.agregar(identificacion)
+        with self._lock_filtro:
+            self._filtro = filtro
+            # Lo guardado mientras se armaba quedó en el filtro viejo: la sincronización lo relee
+            self._ultimo_rowid = ultimo
+            self.consultas_filtro["reconstrucciones"] += 1
+
+    def _anotar(self, identificaciones, rowid=None):
+        """Agrega identificaciones recién guardadas por este proceso. Con `rowid` de la fila
+        que sigue a la última sincronizada, la sincronización no vuelve a leerla."""
+        with self._lock_filtro:
+            for identificacion in identificaciones:
+                if identificacion is not None:
+                    self._filtro.agregar(identificacion)
+            if rowid == self._ultimo_rowid + 1:
+                self._ultimo_rowid = rowid
+            lleno = self._filtro.lleno
+        if lleno:
+            self._reconstruir_filtro()
+
+    def sincronizar_filtro(self) -> int:
+        """Agrega lo que guardaron otros procesos (réplicas, importación por CLI).
+        Los pacientes no se borran, así que basta con leer los rowid nuevos."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT rowid, identificacion FROM pacientes WHERE rowid > ? ORDER BY rowid',
+                           (self._ultimo_rowid,))
+            rows = cursor.fetchall()
+        if rows:
+            self._anotar(r[1] for r in rows)
+            with self._lock_filtro:
+                self._ultimo_rowid = max(self._ultimo_rowid, rows[-1][0])
+        return len(rows)
+
+    def estadisticas_filtro(self):
+        with self._lock_filtro:
+            datos = self._filtro.estadisticas()
+            consultas = dict(self.consultas_filtro)
+        # Tasa observada: de las identificaciones que no existían, cuántas pasaron el filtro
+        inexistentes = consultas["descartadas"] + consultas["falsosPositivos"]
+        consultas["tasaObservada"] = round(consultas["falsosPositivos"] / inexistentes, 6) if inexistentes else None
+        datos["consultas"] = consultas
+        return datos
 
     def _init_db(self):
         with sqlite3.connect(self.db_path) as conn:
@@ -25,23 +130,110 @@ class SQLitePacienteRepository:
                     estado TEXT
                 )
             ''')
+            self._init_busqueda(cursor)
             conn.commit()
 
+    def _init_busqueda(self, cursor):
+        """Índice de texto completo sobre el nombre, sincronizado por triggers.
+        La identificación y el id ya tienen índice único (UNIQUE / PRIMARY KEY)."""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'pacientes_fts'")
+        existia = cursor.fetchone() is not None
+        cursor.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS pacientes_fts USING fts5(
+            nombre, content='pacientes', content_rowid='rowid',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3')''')
+        # Durante una carga masiva (fila en carga_masiva, visible solo dentro de esa
+        # transacción) el trigger se salta y save_lote indexa todo el lote de una vez
+        cursor.execute('CREATE TABLE IF NOT EXISTS carga_masiva (activa INTEGER)')
+        cursor.execute('''CREATE TRIGGER IF NOT EXISTS pacientes_fts_ai AFTER INSERT ON pacientes
+            WHEN NOT EXISTS (SELECT 1 FROM carga_masiva) BEGIN
+            INSERT INTO pacientes_fts(rowid, nombre) VALUES (new.rowid, new.nombre); END''')
+        cursor.execute('''CREATE TRIGGER IF NOT EXISTS pacientes_fts_ad AFTER DELETE ON pacientes BEGIN
+            INSERT INTO pacientes_fts(pacientes_fts, rowid, nombre) VALUES ('delete', old.rowid, old.nombre); END''')
+        cursor.execute('''CREATE TRIGGER IF NOT EXISTS pacientes_fts_au AFTER UPDATE OF nombre ON pacientes BEGIN
+            INSERT INTO pacientes_fts(pacientes_fts, rowid, nombre) VALUES ('delete', old.rowid, old.nombre);
+            INSERT INTO pacientes_fts(rowid, nombre) VALUES (new.rowid, new.nombre); END''')
+        if not existia:
+            # Bases creadas antes del índice: se indexan los pacientes ya guardados
+            cursor.execute("INSERT INTO pacientes_fts(pacientes_fts) VALUES ('rebuild')")
+
     def save(self, p: Paciente):
+        """IdentificacionDuplicada si otro proceso la registró después de la validación"""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO pacientes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                str(p.id), p.identificacion, p.tipoIdentificacion.value,
-                p.nombreCompleto, p.genero.value, p.fechaNacimiento,
-                p.datosContacto.email, p.datosContacto.telefono,
-                p.direccion.calle, p.direccion.numero, p.direccion.ciudad,
-                p.estado.value
-            ))
+            try:
+                cursor.execute('''
+                    INSERT INTO pacientes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    str(p.id), p.identificacion, p.tipoIdentificacion.value,
+                    p.nombreCompleto, p.genero.value, p.fechaNacimiento,
+                    p.datosContacto.email, p.datosContacto.telefono,
+                    p.direccion.calle, p.direccion.numero, p.direccion.ciudad,
+                    p.estado.value
+                ))
+            except sqlite3.IntegrityError:
+                raise IdentificacionDuplicada(p.identificacion)
             conn.commit()
+            rowid = cursor.lastrowid
+        self._anotar([p.identificacion], rowid)
         return p
 
+    def save_lote(self, filas) -> int:
+        """Inserta tuplas ya validadas (orden de columnas de la tabla) en una sola
+        transacción con executemany. Devuelve cuántas se guardaron: las que chocan
+        con una identificación existente se ignoran."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.isolation_level = None  # BEGIN/COMMIT explícitos
+        conn.execute('PRAGMA cache_size=-65536')  # 64 MB: los índices (id, identificacion) reciben claves al azar
+        try:
+            cursor = conn.cursor()
+            # IMMEDIATE: con el bloqueo de escritura tomado nadie más inserta, así
+            # que todo rowid mayor al último actual es de este lote
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                cursor.execute('INSERT INTO carga_masiva VALUES (1)')
+                cursor.execute('SELECT COALESCE(MAX(rowid), 0) FROM pacientes')
+                ultimo = cursor.fetchone()[0]
+                cursor.executemany('INSERT OR IGNORE INTO pacientes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', filas)
+                guardadas = cursor.rowcount
+                # Un INSERT ... SELECT al índice de texto en vez de un trigger por fila
+                cursor.execute('''INSERT INTO pacientes_fts(rowid, nombre)
+                    SELECT rowid, nombre FROM pacientes WHERE rowid > ?''', (ultimo,))
+                cursor.execute('DELETE FROM carga_masiva')
+            except BaseException:
+                cursor.execute('ROLLBACK')
+                raise
+            cursor.execute('COMMIT')
+        finally:
+            conn.close()
+        self._anotar(f[1] for f in filas)
+        return guardadas
+
+    def identificaciones_existentes(self, identificaciones) -> set:
+        """Cuáles de estas identificaciones ya están registradas. Las que el filtro de
+        Bloom descarta no se consultan; el resto va en IN por lotes sobre el índice único."""
+        with self._lock_filtro:
+            filtro = self._filtro
+        posibles = [i for i in identificaciones if i in filtro]
+        existentes = set()
+        if posibles:
+            existentes = self._consultar_existentes(posibles)
+        with self._lock_filtro:
+            self.consultas_filtro["descartadas"] += len(identificaciones) - len(posibles)
+            self.consultas_filtro["existentes"] += len(existentes)
+            self.consultas_filtro["falsosPositivos"] += len(set(posibles) - existentes)
+        return existentes
+
+    def _consultar_existentes(self, identificaciones) -> set:
+        existentes = set()
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            for i in range(0, len(identificaciones), 500):
+                lote = identificaciones[i:i + 500]
+                marcas = ",".join("?" * len(lote))
+                cursor.execute(f'SELECT identificacion FROM pacientes WHERE identificacion IN ({marcas})', lote)
+                existentes.update(r[0] for r in cursor.fetchall())
+        return existentes
+
     def find_by_id(self, id_paciente: str) -> Paciente:
         """
         Recupera un registro de la BD y lo reconstruye como Objeto de Dominio (Paciente).
@@ -54,31 +246,74 @@ class SQLitePacienteRepository:
             if not row:
                 return None
             
-            # Mapeo de columnas a variables (según el orden del CREATE TABLE)
-            # 0:id, 1:identificacion, 2:tipo_id, 3:nombre, 4:genero, 
-            # 5:fecha, 6:email, 7:tel, 8:calle, 9:num, 10:ciudad, 11:estado
-
             try:
-                # Reconstruir Enums y Value Objects
-                tipo_enum = TipoIdentificacion(row[2])
-                genero_enum = Genero(row[4])
-                contacto = DatosContacto(row[6], row[7])
-                direccion = Direccion(row[8], row[9], row[10])
-                
-                # Instanciar la Entidad
-                p = Paciente(row[1], tipo_enum, row[3], genero_enum, row[5], contacto, direccion)
-                
-                # IMPORTANTE: Sobrescribir el ID generado por el constructor con el de la BD
-                p.id = row[0] 
-                
-                # Restaurar el estado
-                p.estado = EstadoPaciente(row[11])
-                
-                return p
+                return self._row_to_paciente(row)
             except ValueError as e:
                 print(f"Error de integridad de datos en ID {id_paciente}: {e}")
                 return None
 
+    def _row_to_paciente(self, row) -> Paciente:
+        """Fila de `pacientes` -> Paciente. ValueError si un enum guardado no es válido"""
+        # Mapeo de columnas a variables (según el orden del CREATE TABLE)
+        # 0:id, 1:identificacion, 2:tipo_id, 3:nombre, 4:genero, 
+        # 5:fecha, 6:email, 7:tel, 8:calle, 9:num, 10:ciudad, 11:estado
+
+        # Reconstruir Enums y Value Objects
+        tipo_enum = TipoIdentificacion(row[2])
+        genero_enum = Genero(row[4])
+        contacto = DatosContacto(row[6], row[7])
+        direccion = Direccion(row[8], row[9], row[10])
+        
+        # Instanciar la Entidad
+        p = Paciente(row[1], tipo_enum, row[3], genero_enum, row[5], contacto, direccion)
+        
+        # IMPORTANTE: Sobrescribir el ID generado por el constructor con el de la BD
+        p.id = row[0] 
+        
+        # Restaurar el estado
+        p.estado = EstadoPaciente(row[11])
+        return p
+
+    def _rows_to_pacientes(self, rows):
+        pacientes = []
+        for row in rows:
+            try:
+                pacientes.append(self._row_to_paciente(row))
+            except ValueError:
+                continue # Saltar registros corruptos si los hubiera
+        return pacientes
+
+    def find_by_claves(self, claves) -> dict:
+        """{clave: Paciente} para claves que pueden ser id (UUID) o identificación.
+        Un IN (...) por lotes sobre cada índice único; las claves sin paciente no aparecen."""
+        por_id = [c for c in claves if _UUID.match(c)]
+        por_identificacion = [c for c in claves if not _UUID.match(c)]
+        encontrados = {}
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            for columna, valores, posicion in (('id', por_id, 0), ('identificacion', por_identificacion, 1)):
+                for i in range(0, len(valores), 500):
+                    lote = valores[i:i + 500]
+                    marcas = ",".join("?" * len(lote))
+                    cursor.execute(f'SELECT * FROM pacientes WHERE {columna} IN ({marcas})', lote)
+                    for row in cursor.fetchall():
+                        try:
+                            encontrados[row[posicion]] = self._row_to_paciente(row)
+                        except ValueError:
+                            continue
+        return encontrados
+
+    def find_by_identificacion(self, identificacion: str) -> Paciente:
+        """Búsqueda exacta por el índice único de identificación"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM pacientes WHERE identificacion = ?', (identificacion,))
+            row = cursor.fetchone()
+            try:
+                return self._row_to_paciente(row) if row else None
+            except ValueError:
+                return None
+
     def update(self, p: Paciente):
         """
         Guarda los cambios realizados en el objeto Paciente de vuelta a la BD.
@@ -98,62 +333,118 @@ class SQLitePacienteRepository:
             conn.commit()
             return cursor.rowcount > 0
 
-    def exists_by_identificacion(self, identificacion: str):
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT id FROM pacientes WHERE identificacion = ?', (identificacion,))
-            return cursor.fetchone() is not None
+    def exists_by_identificacion(self, identificacion: str, exacto: bool = False):
+        """Con el filtro de Bloom un "no existe" no consulta SQLite, pero el filtro es de
+        este proceso: lo guardado por otra réplica o por el importador de línea de comandos
+        aparece recién en la siguiente sincronización (ver sincronizacion_filtro.py).
+        exacto=True consulta siempre la base (antes de registrar)."""
+        if identificacion is None:
+            return False
+        # Como texto: así vuelve de la columna, aunque el JSON la traiga como número
+        identificacion = str(identificacion)
+        if exacto:
+            return identificacion in self._consultar_existentes([identificacion])
+        return identificacion in self.identificaciones_existentes([identificacion])
         
     def find_all(self):
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT * FROM pacientes')
             rows = cursor.fetchall()
-            pacientes = []
-            
-            for row in rows:
-                try:
-                    # Reconstrucción (Misma lógica que find_by_id)
-                    tipo_enum = TipoIdentificacion(row[2])
-                    genero_enum = Genero(row[4])
-                    contacto = DatosContacto(row[6], row[7])
-                    direccion = Direccion(row[8], row[9], row[10])
-                    
-                    p = Paciente(row[1], tipo_enum, row[3], genero_enum, row[5], contacto, direccion)
-                    p.id = row[0]
-                    p.estado = EstadoPaciente(row[11])
-                    
-                    pacientes.append(p)
-                except ValueError:
-                    continue # Saltar registros corruptos si los hubiera
-            
-            return pacientes
+            return self._rows_to_pacientes(rows)
+
+    def iterar_todos(self, lote: int = 1000):
+        """Generador sobre toda la tabla en orden de registro: en memoria solo hay
+        un lote de filas a la vez, sin importar cuántos pacientes existan"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM pacientes ORDER BY rowid')
+            while True:
+                rows = cursor.fetchmany(lote)
+                if not rows:
+                    break
+                yield from self._rows_to_pacientes(rows)
+        finally:
+            conn.close()
+
+    def find_page(self, limite: int, cursor_pagina: str = None):
+        """(pacientes, siguiente_cursor): página por rowid (keyset, sin OFFSET)"""
+        desde = _decodificar_cursor(cursor_pagina, "i")["i"] if cursor_pagina else 0
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT rowid, * FROM pacientes WHERE rowid > ? ORDER BY rowid LIMIT ?',
+                           (desde, limite + 1))
+            rows = cursor.fetchall()
+        siguiente = _codificar_cursor({"i": rows[limite - 1][0]}) if len(rows) > limite else None
+        return self._rows_to_pacientes([r[1:] for r in rows[:limite]]), siguiente
         
-    def search(self, query):
-        """Busca por identificación exacta O por nombre parcial"""
+    # --- BÚSQUEDA: un camino por tipo de consulta ---
+    def search(self, query, limite: int = 50, cursor_pagina: str = None):
+        """(pacientes, siguiente_cursor).
+        - UUID o identificación exacta: un solo registro por índice único
+        - Solo dígitos: identificaciones que empiezan así (rango sobre el índice)
+        - Texto: nombre en el índice de texto completo, por relevancia"""
+        query = (query or '').strip()
+        if not cursor_pagina:
+            exacto = self.find_by_id(query) if _UUID.match(query) else self.find_by_identificacion(query)
+            if exacto:
+                return [exacto], None
+        if query.isdigit():
+            return self._search_por_identificacion(query, limite, cursor_pagina)
+        return self._search_por_nombre(query, limite, cursor_pagina)
+
+    def _search_por_identificacion(self, prefijo, limite, cursor_pagina):
+        desde = _decodificar_cursor(cursor_pagina, "id")["id"] if cursor_pagina else prefijo
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
-            # El % sirve para buscar texto que contenga la palabra
-            param = f"%{query}%" 
-            cursor.execute('''
-                SELECT * FROM pacientes 
-                WHERE identificacion LIKE ? OR nombre LIKE ?
-            ''', (param, param))
-            
+            # Rango [prefijo, prefijo + '\uffff') en lugar de LIKE: usa el índice único
+            cursor.execute(f'''SELECT * FROM pacientes
+                WHERE identificacion {'>' if cursor_pagina else '>='} ? AND identificacion < ?
+                ORDER BY identificacion LIMIT ?''', (desde, prefijo + '\uffff', limite + 1))
             rows = cursor.fetchall()
-            pacientes = []
-            
-            for row in rows:
-                try:
-                    # Reconstrucción (Mismo código que en find_all)
-                    tipo_enum = TipoIdentificacion(row[2])
-                    genero_enum = Genero(row[4])
-                    contacto = DatosContacto(row[6], row[7])
-                    direccion = Direccion(row[8], row[9], row[10])
-                    p = Paciente(row[1], tipo_enum, row[3], genero_enum, row[5], contacto, direccion)
-                    p.id = row[0]
-                    p.estado = EstadoPaciente(row[11])
-                    pacientes.append(p)
-                except Exception:
-                    continue
-            return pacientes
\ No newline at end of file
+        siguiente = _codificar_cursor({"id": rows[limite - 1][1]}) if len(rows) > limite else None
+        return self._rows_to_pacientes(rows[:limite]), siguiente
+
+    def _search_por_nombre(self, texto, limite, cursor_pagina):
+        """Cada palabra como prefijo ('mar lop' -> mar* AND lop*), sin distinguir tildes.
+        Por relevancia (bm25) con cursor (rank, rowid); si hay más de MAX_RANQUEO
+        coincidencias, por orden de registro con cursor (rowid)."""
+        palabras = _PALABRA.findall(texto)
+        if not palabras:
+            return [], None
+        consulta = ' '.join(f'"{p}"*' for p in palabras)
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            if cursor_pagina:
+                marca = _decodificar_cursor(cursor_pagina, "i")
+                por_relevancia = "r" in marca
+            else:
+                marca = None
+                cursor.execute('''SELECT COUNT(*) FROM (
+                    SELECT 1 FROM pacientes_fts WHERE pacientes_fts MATCH ? LIMIT ?)''', (consulta, MAX_RANQUEO + 1))
+                por_relevancia = cursor.fetchone()[0] <= MAX_RANQUEO
+
+            if por_relevancia:
+                filtro, params = '', [consulta]
+                if marca:
+                    filtro, params = 'AND (rank > ? OR (rank = ? AND rowid > ?))', [consulta, marca["r"], marca["r"], marca["i"]]
+                cursor.execute(f'''SELECT f.rank, f.rowid, p.* FROM (
+                        SELECT rowid, rank FROM pacientes_fts WHERE pacientes_fts MATCH ? {filtro}
+                        ORDER BY rank, rowid LIMIT ?) f
+                    JOIN pacientes p ON p.rowid = f.rowid ORDER BY f.rank, f.rowid''', params + [limite + 1])
+            else:
+                filtro, params = '', [consulta]
+                if marca:
+                    filtro, params = 'AND rowid > ?', [consulta, marca["i"]]
+                cursor.execute(f'''SELECT NULL, f.rowid, p.* FROM (
+                        SELECT rowid FROM pacientes_fts WHERE pacientes_fts MATCH ? {filtro}
+                        ORDER BY rowid LIMIT ?) f
+                    JOIN pacientes p ON p.rowid = f.rowid ORDER BY f.rowid''', params + [limite + 1])
+            rows = cursor.fetchall()
+
+        siguiente = None
+        if len(rows) > limite:
+            ultimo = rows[limite - 1]
+            siguiente = _codificar_cursor({"r": ultimo[0], "i": ultimo[1]} if por_relevancia else {"i": ultimo[1]})
+        return self._rows_to_pacientes([r[2:] for r in rows[:limite]]), siguiente
@@ -0,0 +1,21 @@
+import os
+import threading
+import time
+
+INTERVALO_SINCRONIZACION = float(os.getenv("PACIENTES_INTERVALO_SINCRONIZACION", "5"))
+
+def _bucle_sincronizacion(repo):
+    while True:
+        time.sleep(INTERVALO_SINCRONIZACION)
+        try:
+            nuevas = repo.sincronizar_filtro()
+            if nuevas:
+                print(f" [x] Filtro de identificaciones: {nuevas} agregadas desde la base", flush=True)
+        except Exception as e:
+            print(f" [!] Error sincronizando el filtro de identificaciones: {e}", flush=True)
+
+def iniciar_sincronizacion(repo):
+    """Hilo que suma al filtro de Bloom los pacientes guardados por otros procesos
+    (otra réplica del servicio o el importador por línea de comandos). Hasta la
+    siguiente vuelta, /validar puede responder "no existe" para esos pacientes."""
+    threading.Thread(target=_bucle_sincronizacion, args=(repo,), name="sincronizacion-filtro", daemon=True).start()